@@ -0,0 +1,60 @@
+import time
+import numpy
+import fastViterbi
+from context import *
+
+# Throughput benchmarks for training, decoding and backtrace on
+# synthetic sequences, to catch performance regressions.
+
+STATES=["A","C","G","T","a","c","g","t"]
+
+def synthSeq(length,rng,meanIslandLen=1000,meanGapLen=10000):
+    """Return a synthetic labeled sequence of the given length, islands
+    in lower case. Island and non island run lengths are exponential,
+    and bases are drawn GC rich inside islands and AT rich outside.
+    Bases are drawn run by run straight into a uint8 buffer, so memory
+    is about one byte per base."""
+    letterAr=numpy.empty(length,dtype=numpy.uint8)
+    upperAr=numpy.frombuffer(b"ACGT",dtype=numpy.uint8)
+    lowerAr=numpy.frombuffer(b"acgt",dtype=numpy.uint8)
+    total=0
+    island=False
+    while total<length:
+        runLen=min(1+int(rng.exponential(meanIslandLen if island else meanGapLen)),length-total)
+        if island:
+            letterAr[total:total+runLen]=rng.choice(lowerAr,size=runLen,p=[0.15,0.35,0.35,0.15])
+        else:
+            letterAr[total:total+runLen]=rng.choice(upperAr,size=runLen,p=[0.3,0.2,0.2,0.3])
+        total+=runLen
+        island=not island
+    return letterAr.tobytes().decode("ascii")
+
+def timeIt(func,*args):
+    """Return (seconds,result) for one call of func."""
+    start=time.perf_counter()
+    result=func(*args)
+    return time.perf_counter()-start,result
+
+def runBenchmarks(lengthL=(10**3,10**4,10**5,10**6,10**7,10**8),seed=0,printResults=True):
+    """Time fastContext training, fastViterbi decoding and fastBt
+    backtrace on synthetic sequences of each length in lengthL. Return
+    a list of dictionaries with the timings and decoding throughput in
+    bases per second, and print them as a table if printResults."""
+    rng=numpy.random.default_rng(seed)
+    resultL=[]
+    if printResults:
+        print("     length  train(s) decode(s)     bt(s)  bases/sec")
+    for length in lengthL:
+        labeled=synthSeq(length,rng)
+        trainSec,(probD,countD)=timeIt(fastContext,[labeled],1,STATES,1)
+        transD=logDictValues(probD)
+        seq=labeled.upper()
+        decodeSec,(finalScores,btAr)=timeIt(fastViterbi.fastViterbi,seq,transD)
+        btSec,_=timeIt(fastViterbi.fastBt,seq,finalScores,btAr)
+        resultL.append({"length":length,"trainSec":trainSec,"decodeSec":decodeSec,"btSec":btSec,
+                        "basesPerSec":length/(decodeSec+btSec)})
+        if printResults:
+            r=resultL[-1]
+            print(format(length,">11d"),format(r["trainSec"],"9.3f"),format(r["decodeSec"],"9.3f"),
+                  format(r["btSec"],"9.3f"),format(r["basesPerSec"],"12.0f"))
+    return resultL
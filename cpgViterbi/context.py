@@ -1,4 +1,5 @@
 import math
+import numpy
 
 def makeFrags(fragLen, alphabet):
     """Return all possible DNA fragments of len fragLen."""
@@ -35,6 +36,48 @@ def context(seqL,k,alphabet,pseudocount):
         probD[key] = countD[key]/float(originFragD[key[:fragLen-1]])
     return probD,countD
 
+def contextArrays(seqL,k,alphabet,pseudocount,blockSize=4194304):
+    """Array version of context. Encode each seq as uint8 letter codes,
+    roll an integer code for every (k+1)-mer and count with bincount.
+    Return probAr,countAr of shape (len(alphabet)**k,len(alphabet)),
+    where row r is the k letter prefix with base len(alphabet) code r
+    (first letter most significant, letters in alphabet order) and
+    column c is the next letter. Windows containing letters outside
+    alphabet are skipped, as in context. Sequences are processed in
+    blocks of blockSize windows to bound memory."""
+    fragLen=k+1
+    numLetters=len(alphabet)
+    codeAr=numpy.full(256,255,dtype=numpy.uint8)
+    for code,letter in enumerate(alphabet):
+        codeAr[ord(letter)]=code
+    countAr=numpy.zeros(numLetters**fragLen,dtype=numpy.int64)
+    for seq in seqL:
+        encAr=codeAr[numpy.frombuffer(seq.encode("ascii"),dtype=numpy.uint8)]
+        # same windows as context: starts 0..len(seq)-2 with a full fragment
+        numWindows=max(0,min(len(seq)-1,len(seq)-fragLen+1))
+        for blockStart in range(0,numWindows,blockSize):
+            blockLen=min(blockSize,numWindows-blockStart)
+            blockAr=encAr[blockStart:blockStart+blockLen+fragLen-1]
+            fragAr=numpy.zeros(blockLen,dtype=numpy.int64)
+            badAr=numpy.zeros(blockLen,dtype=bool)
+            for j in range(fragLen):
+                letterAr=blockAr[j:j+blockLen]
+                badAr|=letterAr==255
+                fragAr=fragAr*numLetters+letterAr
+            countAr+=numpy.bincount(fragAr[~badAr],minlength=len(countAr))
+    countAr=countAr.reshape(numLetters**k,numLetters)+pseudocount
+    probAr=countAr/countAr.sum(axis=1,keepdims=True)
+    return probAr,countAr
+
+def fastContext(seqL,k,alphabet,pseudocount):
+    """Same as context, but counting with contextArrays. Return
+    probD,countD."""
+    probAr,countAr=contextArrays(seqL,k,alphabet,pseudocount)
+    fragL=makeFrags(k+1,alphabet) # same order as the flattened arrays
+    probD=dict(zip(fragL,probAr.ravel().tolist()))
+    countD=dict(zip(fragL,countAr.ravel().tolist()))
+    return probD,countD
+
 def logDictValues(D):
     '''Return a new dict whose values are the log of the input dict's values.'''
     newD={}
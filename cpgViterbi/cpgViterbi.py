@@ -1,5 +1,9 @@
 import math
+import multiprocessing
+import re
+import evaluate
 import fasta
+import fastViterbi
 from context import *
 
 
@@ -7,40 +11,34 @@ def islandPedictionSummaryStats(predict,correct):
     """Print some statistics summarizing how good the prediction is
     relative to the correct solution. Our definitions of sensitivity
     and specificity assume the 'lower case' model represents the
-    feature of interest."""
-    trueLower=0
-    trueUpper=0
-    predictLowerAndTrueLower=0
-    predictUpperAndTrueUpper=0
-    for i in range(len(predict)):
-        if correct[i].islower(): trueLower+=1
-        else: trueUpper+=1
-
-        if predict[i].islower() and correct[i].islower(): predictLowerAndTrueLower+=1
-        if predict[i].isupper() and correct[i].isupper(): predictUpperAndTrueUpper+=1
-
-    sensitivity = 1.0 * predictLowerAndTrueLower / trueLower
-    specificity = 1.0 * predictUpperAndTrueUpper / trueUpper
+    feature of interest. See evaluate.compareCalls for the full set of
+    statistics as a dictionary."""
+    statsD = evaluate.compareCalls(predict,correct)
     
-    print("Sensitivity (TPR):", format(sensitivity,".3f"))
-    print("Specificity (TNR):", format(specificity,".3f"))
-    print("Youden's J       :", format(sensitivity + specificity - 1,".3f"))
+    print("Sensitivity (TPR):", format(statsD["sensitivity"],".3f"))
+    print("Specificity (TNR):", format(statsD["specificity"],".3f"))
+    print("Youden's J       :", format(statsD["youdensJ"],".3f"))
     
 
-def runExample():
-    """Wrapper to run the provided cpg example."""
+def runExample(fast=False):
+    """Wrapper to run the provided cpg example. If fast is True, decode
+    with the NumPy engine in fastViterbi."""
     
     states = ["A","C","G","T","a","c","g","t"]
     
     # calculate transition matrix from using A solution for training
     Asolution=fasta.load("A-cpgSolution.fa")[0][1]
-    cpgTransD,cpgCountD=context([Asolution],1,states,1)
+    cpgTransD,cpgCountD=fastContext([Asolution],1,states,1)
     cpgTransD = logDictValues(cpgTransD)
     
     # now use viterbi to get sol for B
     B=fasta.load("B-region.fa")[0][1]
-    scM,btM=viterbi(B,cpgTransD)
-    solB=bt(B,scM,btM)
+    if fast:
+        finalScores,btAr=fastViterbi.fastViterbi(B,cpgTransD)
+        solB=fastViterbi.fastBt(B,finalScores,btAr)
+    else:
+        scM,btM=viterbi(B,cpgTransD)
+        solB=bt(B,scM,btM)
 
     f=open("Bpredict.fa","w")
     print("> prediction",file=f)
@@ -51,6 +49,62 @@ def runExample():
     Bsolution=fasta.load("B-cpgSolution.fa")[0][1]
     islandPedictionSummaryStats(solB,Bsolution)
 
+workerTransD = None # set in each batch worker by initBatchWorker
+workerOutFormat = None
+
+def initBatchWorker(transD, outFormat):
+    """Pool initializer, store the model and output format once per
+    worker process."""
+    global workerTransD, workerOutFormat
+    workerTransD = transD
+    workerOutFormat = outFormat
+
+def decodeRecord(record):
+    """Decode one (header,seq) record with the worker's model. Stretches
+    of N or other non ACGT characters are left as they are and each
+    ACGT stretch between them is decoded on its own. Return header and
+    what the output format needs: the re-cased sequence for 'fasta', the
+    island intervals for 'bed'. Models of any order are handled through
+    fastViterbi.decode."""
+    header, seq = record
+    pieceL = []
+    islandL = []
+    last = 0
+    for match in re.finditer("[ACGTacgt]+", seq):
+        if workerOutFormat == "fasta":
+            pieceL.append(seq[last:match.start()])
+            pieceL.append(fastViterbi.decode(match.group(), workerTransD, "seq"))
+            last = match.end()
+        else:
+            offset = match.start()
+            islandL.extend((start + offset, end + offset, state) for start, end, state in fastViterbi.decode(match.group(), workerTransD, "intervals") if state == "I")
+    if workerOutFormat == "fasta":
+        pieceL.append(seq[last:])
+        return header, "".join(pieceL)
+    return header, islandL
+
+def batchPredict(inFileName, outFileName, transD, numWorkers=None, outFormat="fasta"):
+    """Decode every record of a multifasta file on a pool of numWorkers
+    processes (default one per core). transD is the log transition
+    dictionary, sent to each worker once. Results are written in input
+    order, either as fasta with islands in lower case (outFormat
+    'fasta') or as BED lines of island intervals (outFormat 'bed').
+    Non ACGT characters are copied through unchanged (see
+    decodeRecord)."""
+    if outFormat not in ("fasta", "bed"):
+        raise ValueError("outFormat should be 'fasta' or 'bed'.")
+    # leaving the with block terminates the pool, so an error or an
+    # interrupt does not wait for the queued records to be decoded
+    with open(outFileName, "w") as f, multiprocessing.Pool(numWorkers, initializer=initBatchWorker, initargs=(transD, outFormat)) as pool:
+        for header, result in pool.imap(decodeRecord, fasta.iterRecords(inFileName), chunksize=4):
+            if outFormat == "fasta":
+                print(header, file=f)
+                print(result, file=f)
+            else:
+                name = header[1:].split()[0] if header else "."
+                for start, end, state in result:
+                    print(name, start, end, sep="\t", file=f)
+
 def viterbi(seq, transD):
     '''Runs viterbi algorithm to find most likely path through CPG island and non CPG island states for the
     given data'''
@@ -96,8 +150,8 @@ def viterbi(seq, transD):
 def bt(seq, scM, btM):
     '''Calculate the most probable path through seq, representing cpg islands as
     lowercase, and non cpg islands as uppercase'''
-    cpgSeq = ""
     length = len(seq)
+    cpgL = [None] * length # filled back to front, joined at the end
     # Find the final probability for cpg or non cpg islands
     finalProbNon = scM[0][length - 1]
     finalProbIs = scM[1][length - 1]
@@ -115,9 +169,9 @@ def bt(seq, scM, btM):
         char = seq[location]
         # add to cpg sequence based on current character and state
         if currentState == "island":
-            cpgSeq = char.lower() + cpgSeq
+            cpgL[location] = char.lower()
         else:
-            cpgSeq = char.upper() + cpgSeq
+            cpgL[location] = char.upper()
         # Change state based on backtrace table
         if prevCPG == "I":
             currentState = "island"
@@ -125,6 +179,6 @@ def bt(seq, scM, btM):
         else:
             currentState = "nonIsland"
             bt = btM[0]
-    return cpgSeq
+    return "".join(cpgL)
 
 
@@ -0,0 +1,55 @@
+import numpy
+
+# Accuracy of island calls against a known solution. Both are strings
+# with islands in lower case, compared in bulk as byte arrays.
+
+def caseMasks(seq):
+    """Return boolean arrays marking the lower and upper case letters of
+    seq."""
+    seqAr=numpy.frombuffer(seq.encode("ascii"),dtype=numpy.uint8)
+    lowerAr=(seqAr>=ord("a"))&(seqAr<=ord("z"))
+    upperAr=(seqAr>=ord("A"))&(seqAr<=ord("Z"))
+    return lowerAr,upperAr
+
+def maskIntervals(maskAr):
+    """Return start and end (exclusive) arrays of the runs of True in
+    maskAr."""
+    edgeAr=numpy.diff(numpy.concatenate(([0],maskAr.astype(numpy.int8),[0])))
+    return numpy.flatnonzero(edgeAr==1),numpy.flatnonzero(edgeAr==-1)
+
+def overlapsAny(startAr,endAr,otherStartAr,otherEndAr):
+    """For each interval (startAr[i],endAr[i]) say whether it overlaps
+    any of the sorted, non overlapping other intervals."""
+    idxAr=numpy.searchsorted(otherEndAr,startAr,side="right") # first other ending after start
+    hitAr=numpy.zeros(len(startAr),dtype=bool)
+    inRangeAr=idxAr<len(otherStartAr)
+    hitAr[inRangeAr]=otherStartAr[idxAr[inRangeAr]]<endAr[inRangeAr]
+    return hitAr
+
+def ratio(num,denom):
+    return num/denom if denom>0 else float("nan")
+
+def compareCalls(predict,correct):
+    """Compare predicted island calls to the correct solution, treating
+    lower case (island) as the feature of interest. Return a dictionary
+    with base level sensitivity, specificity, Youden's J and precision,
+    and interval level precision (fraction of predicted islands
+    overlapping a true island) and recall (fraction of true islands
+    overlapped by a predicted one)."""
+    if len(predict)!=len(correct):
+        raise ValueError("predict and correct should be the same length.")
+    predLowerAr,predUpperAr=caseMasks(predict)
+    trueLowerAr,trueUpperAr=caseMasks(correct)
+    statsD={}
+    statsD["sensitivity"]=ratio(int((predLowerAr&trueLowerAr).sum()),int(trueLowerAr.sum()))
+    statsD["specificity"]=ratio(int((predUpperAr&trueUpperAr).sum()),int(trueUpperAr.sum()))
+    statsD["youdensJ"]=statsD["sensitivity"]+statsD["specificity"]-1
+    statsD["basePrecision"]=ratio(int((predLowerAr&trueLowerAr).sum()),int(predLowerAr.sum()))
+
+    predStartAr,predEndAr=maskIntervals(predLowerAr)
+    trueStartAr,trueEndAr=maskIntervals(trueLowerAr)
+    statsD["numPredictedIslands"]=len(predStartAr)
+    statsD["numTrueIslands"]=len(trueStartAr)
+    statsD["intervalPrecision"]=ratio(int(overlapsAny(predStartAr,predEndAr,trueStartAr,trueEndAr).sum()),len(predStartAr))
+    statsD["intervalRecall"]=ratio(int(overlapsAny(trueStartAr,trueEndAr,predStartAr,predEndAr).sum()),len(trueStartAr))
+    return statsD
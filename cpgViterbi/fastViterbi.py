@@ -0,0 +1,525 @@
+import math
+import itertools
+import numpy
+import fasta
+
+# NumPy backed CpG island decoder. Sequences are encoded once as uint8
+# base codes (A,C,G,T -> 0,1,2,3) and the log transition dictionary
+# from context() becomes a dense matrix indexed by [caseCode,baseCode].
+# For a first order model caseCode has bit 1 set if the previous base
+# is in the island (lower case) state and bit 0 set if the next base
+# is, so 0=NN, 1=NI, 2=IN, 3=II. baseCode is prevBase*4+nextBase.
+# State 0 is the non island (upper case) state and state 1 the island
+# (lower case) state, matching the order of viterbi's scoreTable.
+
+NUCS="ACGT"
+STATENAMES="NI"
+
+baseCodeAr=numpy.full(256,255,dtype=numpy.uint8)
+for code,base in enumerate(NUCS):
+    baseCodeAr[ord(base)]=code
+    baseCodeAr[ord(base.lower())]=code
+
+def encodeSeq(seq):
+    """Return seq as a uint8 array of base codes (case ignored). Raise
+    ValueError if seq contains characters other than ACGT."""
+    if isinstance(seq,str):
+        seq=seq.encode("ascii")
+    codeAr=baseCodeAr[numpy.frombuffer(seq,dtype=numpy.uint8)]
+    if (codeAr==255).any():
+        raise ValueError("Sequence contains characters other than ACGT.")
+    return codeAr
+
+def transMatrix(transD):
+    """Convert a (log) transition dictionary from context(), with keys
+    like 'Ac', into a dense matrix of shape (2**(k+1),4**(k+1)) indexed
+    by [caseCode,baseCode]. Keys are decoded all at once as bytes, since
+    a k order dictionary has 8**(k+1) of them."""
+    fragLen=len(next(iter(transD)))
+    keyAr=numpy.frombuffer("".join(transD).encode("ascii"),dtype=numpy.uint8).reshape(-1,fragLen)
+    caseAr=numpy.zeros(len(keyAr),dtype=numpy.intp)
+    baseAr=numpy.zeros(len(keyAr),dtype=numpy.intp)
+    for j in range(fragLen):
+        caseAr=caseAr*2+((keyAr[:,j]&0x20)>0) # lower case letters have bit 0x20
+        baseAr=baseAr*4+baseCodeAr[keyAr[:,j]]
+    transM=numpy.empty((2**fragLen,4**fragLen))
+    transM[caseAr,baseAr]=numpy.fromiter(transD.values(),dtype=float,count=len(transD))
+    return transM
+
+def pairCodes(codeAr):
+    """Return the baseCode of each adjacent pair of positions in codeAr."""
+    return codeAr[:-1].astype(numpy.intp)*4+codeAr[1:]
+
+def kmerCodes(codeAr,k):
+    """Return the baseCode of each window of k+1 positions in codeAr
+    (the windows ending at positions k to len(codeAr)-1)."""
+    numWindows=max(0,len(codeAr)-k)
+    kmerAr=numpy.zeros(numWindows,dtype=numpy.intp)
+    for j in range(k+1):
+        kmerAr=kmerAr*4+codeAr[j:j+numWindows]
+    return kmerAr
+
+def viterbiBlock(pairAr,transM,sc0,sc1,btAr):
+    """Extend a first order Viterbi recursion over the pairs in pairAr,
+    starting from scores sc0 (non island) and sc1 (island). Write back
+    pointers into btAr, an int8 array of shape (2,len(pairAr)), and
+    return the final scores. Ties go to the non island state, as in
+    cpgViterbi.viterbi."""
+    # gather the four transitions for every position up front, leaving
+    # only the max-plus recursion itself in the loop
+    tNNL=transM[0][pairAr].tolist()
+    tNIL=transM[1][pairAr].tolist()
+    tINL=transM[2][pairAr].tolist()
+    tIIL=transM[3][pairAr].tolist()
+    btN=bytearray(len(pairAr))
+    btI=bytearray(len(pairAr))
+    for j in range(len(pairAr)):
+        nontonon=sc0+tNNL[j]
+        nontois=sc0+tNIL[j]
+        istonon=sc1+tINL[j]
+        istois=sc1+tIIL[j]
+        if istois>nontois:
+            new1=istois
+            btI[j]=1
+        else:
+            new1=nontois
+        if istonon>nontonon:
+            sc0=istonon
+            btN[j]=1
+        else:
+            sc0=nontonon
+        sc1=new1
+    btAr[0]=numpy.frombuffer(btN,dtype=numpy.int8)
+    btAr[1]=numpy.frombuffer(btI,dtype=numpy.int8)
+    return sc0,sc1
+
+def viterbiBlocks(codeAr,transM,sc0,sc1,btAr,blockSize=1048576):
+    """Run viterbiBlock over the pairs of codeAr blockSize pairs at a
+    time, carrying the scores between blocks, so the per position lists
+    viterbiBlock builds stay a fixed size however long codeAr is. btAr
+    has one column per pair. Return the final scores."""
+    for start in range(0,len(codeAr)-1,blockSize):
+        end=min(start+blockSize,len(codeAr)-1)
+        sc0,sc1=viterbiBlock(pairCodes(codeAr[start:end+1]),transM,sc0,sc1,btAr[:,start:end])
+    return sc0,sc1
+
+def fastViterbi(seq,transD,blockSize=1048576):
+    """Run the Viterbi algorithm for the two state CpG model. transD is
+    the log transition dictionary from context(). Return the final
+    (non island,island) scores and an int8 back pointer array of shape
+    (2,len(seq)), where btAr[s,i] is the state at i-1 on the best path
+    into state s at i (-1 at i=0). The recursion runs in blocks of
+    blockSize positions (see viterbiBlocks), so memory beyond the 2
+    bytes per base of btAr is bounded. Raise ValueError if transD is
+    not a first order model; use decode for higher orders."""
+    if len(next(iter(transD)))!=2:
+        raise ValueError("fastViterbi needs a first order model; use decode for higher orders.")
+    codeAr=encodeSeq(seq)
+    transM=transMatrix(transD)
+    btAr=numpy.empty((2,len(codeAr)),dtype=numpy.int8)
+    btAr[:,0]=-1
+    finalScores=viterbiBlocks(codeAr,transM,math.log(0.5),math.log(0.5),btAr[:,1:],blockSize)
+    return finalScores,btAr
+
+def traceFrom(state,btAr,pathB):
+    """Fill bytearray pathB with the states of the path that is in
+    state at the last column of btAr, following back pointers. The
+    first column of btAr is never read."""
+    # bytes index as Python ints like a list, at 1 byte per position
+    btN=btAr[0].tobytes()
+    btI=btAr[1].tobytes()
+    for location in range(len(pathB)-1,-1,-1):
+        pathB[location]=state
+        state=btI[location] if state else btN[location]
+
+def tracePath(finalScores,btAr,out=None):
+    """Backtrace through btAr and return the best state path as a uint8
+    array (0 non island, 1 island). If out is given (a bytearray or
+    uint8 array of length btAr.shape[1]) the path is written into it
+    in place."""
+    length=btAr.shape[1]
+    if out is not None and len(out)!=length:
+        raise ValueError("out must have one entry per sequence position.")
+    # the loop writes into a bytearray, which is much cheaper to index
+    # from Python than a numpy array
+    pathB=out if isinstance(out,bytearray) else bytearray(length)
+    state=1 if finalScores[1]>finalScores[0] else 0
+    traceFrom(state,btAr,pathB)
+    pathAr=numpy.frombuffer(pathB,dtype=numpy.uint8)
+    if out is not None and not isinstance(out,bytearray):
+        out[:]=pathAr
+        pathAr=out
+    return pathAr
+
+def applyPath(seq,pathAr):
+    """Return seq with positions in state 1 of pathAr in lower case and
+    the rest in upper case."""
+    seqAr=numpy.frombuffer(seq.encode("ascii"),dtype=numpy.uint8)
+    # ASCII upper and lower case differ only in bit 0x20
+    outAr=numpy.where(pathAr==1,seqAr|0x20,seqAr&0xDF).astype(numpy.uint8)
+    return outAr.tobytes().decode("ascii")
+
+def pathIntervals(pathAr,offset=0):
+    """Convert a state path into run length intervals. Return a list of
+    (start,end,state) tuples with 0 based, end exclusive (BED style)
+    coordinates shifted by offset, and state 'I' (island) or 'N'."""
+    if len(pathAr)==0:
+        return []
+    changeAr=numpy.flatnonzero(pathAr[1:]!=pathAr[:-1])+1
+    startL=[0]+changeAr.tolist()
+    endL=changeAr.tolist()+[len(pathAr)]
+    outL=[]
+    for start,end in zip(startL,endL):
+        outL.append((start+offset,end+offset,STATENAMES[pathAr[start]]))
+    return outL
+
+def fastBt(seq,finalScores,btAr,mode="seq",out=None):
+    """Backtrace through btAr. With mode 'seq' return seq with island
+    positions in lower case and the rest in upper case, the same result
+    as cpgViterbi.bt. With mode 'intervals' return the calls as a list
+    of (start,end,state) from pathIntervals instead. out is an optional
+    preallocated buffer for the state path (see tracePath)."""
+    pathAr=tracePath(finalScores,btAr,out)
+    if mode=="seq":
+        return applyPath(seq,pathAr)
+    elif mode=="intervals":
+        return pathIntervals(pathAr)
+    else:
+        raise ValueError("mode should be 'seq' or 'intervals'.")
+
+SCALARORDER=4 # orders up to this run the unrolled scalar recursion
+
+def orderStepsScalar(rowL,scoreL,btB):
+    """k order Viterbi recursion in plain Python, for small k where the
+    per call overhead of numpy on 2**k element arrays dominates. rowL
+    holds, per position, the 2*2**k transition scores by caseCode, and
+    btB (a bytearray of len(rowL)*2**k, zeroed) receives the back
+    pointers. Return the final score list. States 2m and 2m+1 share
+    their two predecessors m and half+m, so each pair is done together."""
+    numStates=len(scoreL)
+    half=numStates>>1
+    mL=list(range(half))
+    for j,rowT in enumerate(rowL):
+        newL=[0.0]*numStates
+        base=j*numStates
+        for m in mL:
+            sc0=scoreL[m]
+            sc1=scoreL[half+m]
+            state=2*m
+            drop0=sc0+rowT[state]
+            drop1=sc1+rowT[numStates+state]
+            if drop1>drop0:
+                newL[state]=drop1
+                btB[base+state]=1
+            else:
+                newL[state]=drop0
+            state+=1
+            drop0=sc0+rowT[state]
+            drop1=sc1+rowT[numStates+state]
+            if drop1>drop0:
+                newL[state]=drop1
+                btB[base+state]=1
+            else:
+                newL[state]=drop0
+        scoreL=newL
+    return scoreL
+
+def orderStepsArray(rowAr,scoreAr,btAr):
+    """The recursion of orderStepsScalar with numpy, for larger k. Views
+    pair up states sharing predecessors, so each position is four
+    ufunc calls into preallocated buffers. Updates scoreAr in place."""
+    numStates=len(scoreAr)
+    half=numStates>>1
+    drop0Ar=rowAr[:,:numStates].reshape(-1,half,2)
+    drop1Ar=rowAr[:,numStates:].reshape(-1,half,2)
+    cand0Ar=numpy.empty((half,2))
+    cand1Ar=numpy.empty((half,2))
+    btV=btAr.reshape(-1,half,2).view(bool)
+    pairV=scoreAr.reshape(half,2)
+    pred0V=scoreAr[:half,None]
+    pred1V=scoreAr[half:,None]
+    for j in range(len(rowAr)):
+        numpy.add(drop0Ar[j],pred0V,out=cand0Ar)
+        numpy.add(drop1Ar[j],pred1V,out=cand1Ar)
+        numpy.greater(cand1Ar,cand0Ar,out=btV[j]) # ties to dropped bit 0
+        numpy.maximum(cand0Ar,cand1Ar,out=pairV)
+
+def orderBlocks(kmerAr,transM,k,scoreAr,btAr,blockSize=1048576):
+    """Extend a k order Viterbi recursion over the windows in kmerAr,
+    starting from scoreAr (2**k scores). Write the dropped bit of each
+    state's best predecessor into btAr, an int8 array of shape
+    (len(kmerAr),2**k), and return the final scores. Transition rows
+    are gathered about blockSize scores at a time."""
+    numStates=2**k
+    scoreAr=numpy.array(scoreAr,dtype=float)
+    rowsPerBlock=max(1,blockSize//(2*numStates))
+    for start in range(0,len(kmerAr),rowsPerBlock):
+        rowAr=transM.T[kmerAr[start:start+rowsPerBlock]]
+        if k<=SCALARORDER:
+            btB=bytearray(rowAr.size//2)
+            scoreAr=numpy.array(orderStepsScalar(rowAr.tolist(),scoreAr.tolist(),btB))
+            btAr[start:start+len(rowAr)]=numpy.frombuffer(btB,dtype=numpy.int8).reshape(-1,numStates)
+        else:
+            orderStepsArray(rowAr,scoreAr,btAr[start:start+len(rowAr)])
+    return scoreAr
+
+def orderViterbi(seq,transD,blockSize=1048576):
+    """Run the Viterbi algorithm for a k order CpG model, where transD is
+    the log transition dictionary from context(seqL,k,...) and k is
+    taken from its key length. The hidden state at position i holds the
+    island bits of positions i-k+1..i (bit 0 for i), giving 2**k
+    states. Each state has only two possible predecessors, differing in
+    the bit that drops out of the window, so a step costs O(2**k)
+    rather than O(4**k). Return the final scores (array of 2**k) and
+    an int8 back pointer array of shape (len(seq),2**k) holding the
+    dropped bit of the best predecessor (0 for positions before k).
+    The back pointers take 2**k bytes per base; decode and
+    streamViterbi keep only a bounded window of them."""
+    k=len(next(iter(transD)))-1
+    numStates=2**k
+    codeAr=encodeSeq(seq)
+    transM=transMatrix(transD)
+    btAr=numpy.zeros((len(codeAr),numStates),dtype=numpy.int8)
+    # uniform over the island bits of the first k bases, as viterbi
+    # does for k=1
+    scoreAr=numpy.full(numStates,math.log(0.5**k))
+    scoreAr=orderBlocks(kmerCodes(codeAr,k),transM,k,scoreAr,btAr[k:],blockSize)
+    return scoreAr,btAr
+
+def orderTracePath(finalScoreAr,btAr):
+    """Backtrace through an orderViterbi back pointer array and return
+    the best path as a uint8 array of island bits (as tracePath)."""
+    length,numStates=btAr.shape
+    k=numStates.bit_length()-1
+    pathB=bytearray(length)
+    if length<k:
+        return numpy.frombuffer(pathB,dtype=numpy.uint8)
+    btB=btAr.tobytes()
+    state=int(finalScoreAr.argmax())
+    for location in range(length-1,k-1,-1):
+        pathB[location]=state&1
+        state=((btB[location*numStates+state]<<k)|state)>>1
+    # the state at k-1 holds the bits of all of the first k positions
+    for location in range(k):
+        pathB[location]=(state>>(k-1-location))&1
+    return numpy.frombuffer(pathB,dtype=numpy.uint8)
+
+def decode(seq,transD,mode="seq",blockSize=65536):
+    """Decode seq under a CpG model of any order, dispatching to the
+    first order engine when k is 1. Higher orders run through an
+    OrderSegmentDecoder fed blockSize bases at a time, so only the back
+    pointers since the last survivor merge are held rather than 2**k
+    bytes per base. Return as fastBt does for mode."""
+    if mode not in ("seq","intervals"):
+        raise ValueError("mode should be 'seq' or 'intervals'.")
+    k=len(next(iter(transD)))-1
+    if k==1:
+        finalScores,btAr=fastViterbi(seq,transD)
+        pathAr=tracePath(finalScores,btAr)
+    else:
+        codeAr=encodeSeq(seq)
+        pathB=bytearray(len(codeAr))
+        decoder=OrderSegmentDecoder(transMatrix(transD),k,0)
+        for start in range(0,len(codeAr),blockSize):
+            for pieceStart,pieceAr in decoder.extend(codeAr[start:start+blockSize]):
+                pathB[pieceStart:pieceStart+len(pieceAr)]=pieceAr.tobytes()
+        for pieceStart,pieceAr in decoder.finish():
+            pathB[pieceStart:pieceStart+len(pieceAr)]=pieceAr.tobytes()
+        pathAr=numpy.frombuffer(pathB,dtype=numpy.uint8)
+    if mode=="seq":
+        return applyPath(seq,pathAr)
+    return pathIntervals(pathAr)
+
+class SegmentDecoder:
+    """Incremental first order Viterbi decoding of one stretch of ACGT
+    bases starting at position start. Only back pointers since the last
+    point where the two survivor paths merge are kept. Once the best
+    paths into both states at some position share a predecessor, every
+    earlier position is fixed, so memory is bounded by the chunk size
+    plus the longest stretch without such a merge rather than by the
+    sequence length."""
+
+    def __init__(self,transM,start):
+        self.transM=transM
+        self.sc0=self.sc1=math.log(0.5)
+        self.prevCode=None
+        self.doneLen=start # positions before this are final
+        self.end=start # position after the last base seen
+        self.pendingAr=numpy.empty((2,0),dtype=numpy.int8) # columns doneLen onward
+
+    def extend(self,codeAr):
+        """Add the bases codeAr (uint8 base codes). Return the newly
+        final stretches of the path as a list of (start,pathAr)."""
+        btAr=numpy.empty((2,len(codeAr)),dtype=numpy.int8)
+        if self.prevCode is None:
+            btAr[:,0]=-1
+            self.sc0,self.sc1=viterbiBlocks(codeAr,self.transM,self.sc0,self.sc1,btAr[:,1:])
+        else:
+            self.sc0,self.sc1=viterbiBlocks(numpy.concatenate(([self.prevCode],codeAr)),self.transM,self.sc0,self.sc1,btAr)
+        self.prevCode=codeAr[-1]
+        self.end+=len(codeAr)
+        self.pendingAr=numpy.concatenate((self.pendingAr,btAr),axis=1)
+
+        # last column where both states point back to the same state
+        mergeAr=numpy.flatnonzero(self.pendingAr[0,1:]==self.pendingAr[1,1:])
+        if len(mergeAr)==0:
+            return []
+        p=int(mergeAr[-1])+1
+        pathB=bytearray(p)
+        traceFrom(int(self.pendingAr[0,p]),self.pendingAr[:,:p],pathB)
+        self.pendingAr=self.pendingAr[:,p:].copy()
+        return [self.addPath(pathB)]
+
+    def addPath(self,pathB):
+        """Mark the states in pathB final from doneLen on."""
+        start=self.doneLen
+        self.doneLen+=len(pathB)
+        return start,numpy.frombuffer(pathB,dtype=numpy.uint8)
+
+    def finish(self):
+        """Trace back from the best final state. Return the rest of the
+        path as extend does."""
+        if self.pendingAr.shape[1]==0:
+            return []
+        pathB=bytearray(self.pendingAr.shape[1])
+        traceFrom(1 if self.sc1>self.sc0 else 0,self.pendingAr,pathB)
+        return [self.addPath(pathB)]
+
+class OrderSegmentDecoder(SegmentDecoder):
+    """SegmentDecoder for a k order model (k>1), with the state space and
+    back pointers of orderViterbi. Here all 2**k survivor paths have to
+    merge: after each extend the distinct states of the survivors are
+    followed back until only one is left, and everything up to that
+    position is final."""
+
+    def __init__(self,transM,k,start):
+        self.transM=transM
+        self.k=k
+        self.numStates=2**k
+        self.scoreAr=numpy.full(self.numStates,math.log(0.5**k))
+        self.tailAr=numpy.empty(0,dtype=numpy.uint8) # last k bases
+        self.segStart=start
+        self.doneLen=start
+        self.end=start
+        self.pendingAr=numpy.zeros((0,self.numStates),dtype=numpy.int8) # rows doneLen onward
+
+    def extend(self,codeAr):
+        k=self.k
+        windowAr=numpy.concatenate((self.tailAr,codeAr))
+        kmerAr=kmerCodes(windowAr,k) # windows ending in codeAr
+        btAr=numpy.zeros((len(codeAr),self.numStates),dtype=numpy.int8)
+        if len(kmerAr)>0:
+            self.scoreAr=orderBlocks(kmerAr,self.transM,k,self.scoreAr,btAr[len(codeAr)-len(kmerAr):])
+        self.tailAr=windowAr[-k:]
+        self.end+=len(codeAr)
+        self.pendingAr=numpy.concatenate((self.pendingAr,btAr))
+
+        # follow all survivors back until they share a state
+        btB=self.pendingAr.tobytes()
+        stateS=set(range(self.numStates))
+        for location in range(self.end-1,max(self.segStart+k,self.doneLen+1)-1,-1):
+            base=(location-self.doneLen)*self.numStates
+            stateS={((btB[base+state]<<k)|state)>>1 for state in stateS}
+            if len(stateS)==1:
+                # every survivor passes through this state at location-1
+                pathB=self.tracePending(stateS.pop(),location-1,btB)
+                self.pendingAr=self.pendingAr[location-self.doneLen:].copy()
+                return [self.addPath(pathB)]
+        return []
+
+    def tracePending(self,state,last,btB):
+        """Path for positions doneLen..last given the state at last, from
+        the pending back pointers btB."""
+        k=self.k
+        pathB=bytearray(last+1-self.doneLen)
+        location=last
+        while location>=max(self.doneLen,self.segStart+k):
+            pathB[location-self.doneLen]=state&1
+            state=((btB[(location-self.doneLen)*self.numStates+state]<<k)|state)>>1
+            location-=1
+        # the state at segStart+k-1 holds the bits of the first k positions
+        for location in range(self.doneLen,min(last+1,self.segStart+k)):
+            pathB[location-self.doneLen]=(state>>(self.segStart+k-1-location))&1
+        return pathB
+
+    def finish(self):
+        if self.end==self.doneLen:
+            return []
+        if self.end-self.segStart<self.k:
+            # too short for a window, as orderTracePath
+            return [self.addPath(bytearray(self.end-self.doneLen))]
+        return [self.addPath(self.tracePending(int(self.scoreAr.argmax()),self.end-1,self.pendingAr.tobytes()))]
+
+def acgtRuns(codeAr):
+    """Return (start,end) of each run of valid base codes in codeAr (as
+    from baseCodeAr, with 255 for anything other than ACGT)."""
+    validAr=numpy.concatenate(([False],codeAr!=255,[False]))
+    edgeAr=numpy.flatnonzero(validAr[1:]!=validAr[:-1]).tolist()
+    return list(zip(edgeAr[::2],edgeAr[1::2]))
+
+def streamViterbi(chunkIter,transD):
+    """Generator that decodes one sequence arriving as successive string
+    chunks from chunkIter, yielding (start,end,state) intervals (as in
+    pathIntervals) as soon as they are final. Stretches of N or any
+    other non ACGT character are skipped (no interval covers them) and
+    the recursion restarts after each, so every ACGT stretch is decoded
+    as decode would decode it alone. Models of any order are handled;
+    memory is bounded as described in SegmentDecoder."""
+    k=len(next(iter(transD)))-1
+    transM=transMatrix(transD)
+    pos=0
+    decoder=None
+    openRun=None
+    for chunk in chunkIter:
+        if isinstance(chunk,str):
+            chunk=chunk.encode("ascii")
+        codeAr=baseCodeAr[numpy.frombuffer(chunk,dtype=numpy.uint8)]
+        for start,end in acgtRuns(codeAr):
+            if decoder is not None and decoder.end!=pos+start:
+                # a non ACGT stretch ended the last segment
+                for interval in finalRuns(decoder.finish(),openRun,True)[0]:
+                    yield interval
+                decoder=None
+                openRun=None
+            if decoder is None:
+                decoder=SegmentDecoder(transM,pos+start) if k==1 else OrderSegmentDecoder(transM,k,pos+start)
+            intervalL,openRun=finalRuns(decoder.extend(codeAr[start:end]),openRun,False)
+            for interval in intervalL:
+                yield interval
+        pos+=len(codeAr)
+    if decoder is not None:
+        for interval in finalRuns(decoder.finish(),openRun,True)[0]:
+            yield interval
+
+def finalRuns(pieceL,openRun,closing):
+    """Turn final path pieces (start,pathAr) from a decoder into
+    intervals. The last interval is returned as the new openRun, since
+    it may continue into the next piece, unless closing."""
+    intervalL=[]
+    for start,pathAr in pieceL:
+        intervalL.extend(joinRuns(openRun,pathAr,start))
+        openRun=intervalL.pop()
+    if openRun is not None and closing:
+        intervalL.append(openRun)
+        openRun=None
+    return intervalL,openRun
+
+def joinRuns(openRun,pathAr,offset):
+    """Return the intervals of pathAr (starting at offset), with the
+    first merged into openRun if it continues it."""
+    intervalL=pathIntervals(pathAr,offset)
+    if openRun is None:
+        return intervalL
+    if intervalL[0][2]==openRun[2]:
+        intervalL[0]=(openRun[0],intervalL[0][1],openRun[2])
+        return intervalL
+    return [openRun]+intervalL
+
+def streamIslands(fileName,transD,chunkSize=1048576):
+    """Generator over the records of a (multi)fasta file, read and
+    decoded incrementally with streamViterbi. Yields tuples
+    (header,start,end,state), with no intervals over N runs."""
+    chunkIter=fasta.readChunks(fileName,chunkSize)
+    for (recordNum,header),recordChunks in itertools.groupby(chunkIter,key=lambda t:t[:2]):
+        for start,end,state in streamViterbi((chunk for _,_,chunk in recordChunks),transD):
+            yield header,start,end,state
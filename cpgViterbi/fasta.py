@@ -1,3 +1,7 @@
+import itertools
+import mmap
+import os
+
 
 def load(filename):
     """Load fasta or multifasta, return list of tuples (header,seq)."""
@@ -26,3 +30,163 @@ def load(filename):
             tempSeqL.append(Str)
     f.close()
     return(outL)    
+
+def readChunks(filename,chunkSize=1048576):
+    """Generator over a fasta or multifasta file that never holds a
+    whole sequence in memory. Yields tuples (recordNum,header,chunk)
+    where chunk is a piece of about chunkSize bases with whitespace
+    removed. Every record yields at least one (possibly empty) chunk."""
+    f=open(filename,"r")
+    recordNum=-1
+    header=None
+    tempSeqL=[]
+    tempLen=0
+    yielded=True # nothing is owed before the first record
+    for Str in f:
+        if Str[0]==">":
+            if recordNum>=0 and (tempLen>0 or not yielded):
+                yield recordNum,header,"".join(tempSeqL)
+            recordNum+=1
+            header=Str.rstrip("\n")
+            tempSeqL=[]
+            tempLen=0
+            yielded=False
+        else:
+            if recordNum<0:
+                recordNum=0 # sequence before any header, as in load
+                yielded=False
+            Str="".join(Str.split()) # remove all whitespace
+            tempSeqL.append(Str)
+            tempLen+=len(Str)
+            if tempLen>=chunkSize:
+                chunk="".join(tempSeqL)
+                while len(chunk)>=chunkSize:
+                    yield recordNum,header,chunk[:chunkSize]
+                    chunk=chunk[chunkSize:]
+                    yielded=True
+                tempSeqL=[chunk]
+                tempLen=len(chunk)
+    if recordNum>=0 and (tempLen>0 or not yielded):
+        yield recordNum,header,"".join(tempSeqL)
+    f.close()
+
+def iterRecords(filename):
+    """Generator over a fasta or multifasta file, yielding (header,seq)
+    one record at a time (the same records load returns)."""
+    for (recordNum,header),chunkIter in itertools.groupby(readChunks(filename),key=lambda t:t[:2]):
+        yield header,"".join(chunk for _,_,chunk in chunkIter)
+
+def buildIndex(filename):
+    """Scan a fasta file once and write a samtools style .fai index next
+    to it. Each line holds name, length, byte offset of the first base,
+    bases per line and bytes per line. Lines within a record must all
+    be the same length except the last. Return the index dictionary
+    (see loadIndex)."""
+    indexD={}
+    f=open(filename,"rb")
+    offset=0
+    rec=None # [name,length,offset,lineBases,lineWidth,sawShortLine]
+    for line in f:
+        if line[:1]==b">":
+            if rec is not None:
+                indexD[rec[0]]=tuple(rec[1:5])
+            wordL=line[1:].split()
+            name=wordL[0].decode("ascii") if wordL else ""
+            if name in indexD:
+                f.close()
+                raise ValueError("Duplicate sequence name "+name+" in "+filename+".")
+            rec=[name,0,offset+len(line),0,0,False]
+        else:
+            if rec is None:
+                f.close()
+                raise ValueError("Sequence data before first header in "+filename+".")
+            bases=len(line.rstrip(b"\r\n"))
+            if rec[3]==0 and rec[1]==0:
+                rec[3]=bases
+                rec[4]=len(line)
+            elif rec[5] and bases>0 or bases>rec[3]:
+                f.close()
+                raise ValueError("Record "+rec[0]+" in "+filename+" has uneven line lengths.")
+            elif bases<rec[3]:
+                rec[5]=True
+            rec[1]+=bases
+        offset+=len(line)
+    if rec is not None:
+        indexD[rec[0]]=tuple(rec[1:5])
+    f.close()
+
+    f=open(filename+".fai","w")
+    for name,(length,seqOffset,lineBases,lineWidth) in indexD.items():
+        print(name,length,seqOffset,lineBases,lineWidth,sep="\t",file=f)
+    f.close()
+    return indexD
+
+def loadIndex(faiName):
+    """Load a .fai index, return dictionary keyed by sequence name with
+    values (length,offset,lineBases,lineWidth)."""
+    indexD={}
+    f=open(faiName,"r")
+    for s in f:
+        strL=s.rstrip("\n").split("\t")
+        indexD[strL[0]]=tuple(int(x) for x in strL[1:5])
+    f.close()
+    return indexD
+
+class FastaIndex:
+    """Random access to the records of a fasta file through a .fai index
+    and a memory map of the file. The index is built on first use (or
+    if the fasta file is newer than it) and loaded from disk after
+    that, so opening a large file does not parse it."""
+
+    def __init__(self,filename):
+        faiName=filename+".fai"
+        if not os.path.exists(faiName) or os.path.getmtime(faiName)<os.path.getmtime(filename):
+            self.indexD=buildIndex(filename)
+        else:
+            self.indexD=loadIndex(faiName)
+        self.filename=filename
+        self.f=open(filename,"rb")
+        if os.path.getsize(filename)==0:
+            self.mm=b"" # mmap can't map an empty file
+        else:
+            self.mm=mmap.mmap(self.f.fileno(),0,access=mmap.ACCESS_READ)
+
+    def close(self):
+        if isinstance(self.mm,mmap.mmap):
+            self.mm.close()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*excInfo):
+        self.close()
+
+    def names(self):
+        """Return sequence names in file order."""
+        return list(self.indexD.keys())
+
+    def length(self,name):
+        return self.indexD[name][0]
+
+    def fetch(self,name,start=0,end=None):
+        """Return bases start to end (0 based, end exclusive) of record
+        name, reading only that part of the file."""
+        length,offset,lineBases,lineWidth=self.indexD[name]
+        start=max(start,0)
+        end=length if end is None else min(end,length)
+        if start>=end:
+            return ""
+        startByte=offset+(start//lineBases)*lineWidth+start%lineBases
+        endByte=offset+((end-1)//lineBases)*lineWidth+(end-1)%lineBases+1
+        return self.mm[startByte:endByte].translate(None,b"\r\n").decode("ascii")
+
+    def chunks(self,name,chunkSize=1048576):
+        """Generator over record name in pieces of chunkSize bases."""
+        for start in range(0,self.length(name),chunkSize):
+            yield self.fetch(name,start,start+chunkSize)
+
+    def records(self):
+        """Generator over (name,seq) for every record, in file order."""
+        for name in self.indexD:
+            yield name,self.fetch(name)
@@ -0,0 +1,187 @@
+import math
+import numpy
+import fastViterbi
+
+# Forward-backward for the CpG model of any order, over the same
+# [caseCode,baseCode] transition matrix and state space as
+# fastViterbi.orderViterbi. The sequence is split into chunks of
+# chunkSize positions. Within a chunk the forward and backward
+# variables come from prefix and suffix products of the per position
+# transition matrices, computed with a work efficient parallel scan so
+# that each level is a few batched array operations. Every product is rescaled to a maximum of 1
+# (keeping the log of the scale) so nothing underflows. The forward
+# pass keeps only one vector per chunk boundary, and the backward pass
+# recomputes each chunk's products in reverse order, so memory is
+# O(chunkSize) plus the output.
+
+def modelOrder(transD):
+    return len(next(iter(transD)))-1
+
+def transitionMats(kmerAr,transM,k):
+    """Return the transition matrices for windows kmerAr as an array of
+    shape (len(kmerAr),2**k,2**k), in probability space, along with
+    the per position transition probabilities indexed by caseCode."""
+    numStates=2**k
+    probAr=numpy.exp(transM.T[kmerAr])
+    caseAr=numpy.arange(2*numStates)
+    matAr=numpy.zeros((len(kmerAr),numStates,numStates))
+    matAr[:,caseAr>>1,caseAr&(numStates-1)]=probAr
+    return matAr,probAr
+
+def batchMatmul(aAr,bAr):
+    """Matrix product of two stacks of small square matrices. Summing
+    over the inner index with broadcasting is much faster than
+    numpy.matmul for the 2x2 to 8x8 matrices used here."""
+    outAr=aAr[:,:,0,None]*bAr[:,None,0,:]
+    for l in range(1,aAr.shape[2]):
+        outAr+=aAr[:,:,l,None]*bAr[:,None,l,:]
+    return outAr
+
+def combineProducts(aAr,aLogAr,bAr,bLogAr,reverse):
+    """Multiply each earlier matrix in aAr by the later one in bAr (in
+    the opposite order if reverse), rescale to a maximum of 1 and add
+    up the log scales."""
+    outAr=batchMatmul(bAr,aAr) if reverse else batchMatmul(aAr,bAr)
+    maxAr=outAr.max(axis=(1,2))
+    outAr/=maxAr[:,None,None]
+    return outAr,aLogAr+bLogAr+numpy.log(maxAr)
+
+def scanScaled(prodAr,logScaleAr,reverse):
+    """Work efficient inclusive scan: multiply adjacent pairs, scan the
+    half length result recursively, then fill in the even positions.
+    Total work is about two products per matrix."""
+    if len(prodAr)<2:
+        return prodAr.copy(),logScaleAr.copy()
+    numPairs=len(prodAr)//2
+    pairAr,pairLogAr=combineProducts(prodAr[0:2*numPairs:2],logScaleAr[0:2*numPairs:2],prodAr[1::2],logScaleAr[1::2],reverse)
+    pairAr,pairLogAr=scanScaled(pairAr,pairLogAr,reverse)
+    outAr=numpy.empty_like(prodAr)
+    outLogAr=numpy.empty_like(logScaleAr)
+    outAr[1::2]=pairAr
+    outLogAr[1::2]=pairLogAr
+    outAr[0]=prodAr[0]
+    outLogAr[0]=logScaleAr[0]
+    numEven=(len(prodAr)+1)//2
+    outAr[2::2],outLogAr[2::2]=combineProducts(pairAr[:numEven-1],pairLogAr[:numEven-1],prodAr[2::2],logScaleAr[2::2],reverse)
+    return outAr,outLogAr
+
+def scanProducts(matAr,reverse=False):
+    """Inclusive prefix products matAr[0]...matAr[j] (or suffix products
+    matAr[j]...matAr[-1] if reverse). Return the products scaled to a
+    maximum entry of 1 and the log scales."""
+    maxAr=matAr.max(axis=(1,2))
+    prodAr=matAr/maxAr[:,None,None]
+    logScaleAr=numpy.log(maxAr)
+    if reverse:
+        prodAr,logScaleAr=scanScaled(prodAr[::-1],logScaleAr[::-1],True)
+        return prodAr[::-1],logScaleAr[::-1]
+    return scanScaled(prodAr,logScaleAr,False)
+
+def forwardPass(kmerAr,transM,k,chunkSize):
+    """Run the forward recursion chunk by chunk. Return the normalized
+    forward vector entering each chunk (that is, at the position before
+    its first window) and the log likelihood of the sequence."""
+    numStates=2**k
+    alphaAr=numpy.full(numStates,1.0/numStates)
+    logLik=0.0
+    boundaryL=[]
+    for chunkStart in range(0,len(kmerAr),chunkSize):
+        boundaryL.append(alphaAr)
+        matAr,probAr=transitionMats(kmerAr[chunkStart:chunkStart+chunkSize],transM,k)
+        prodAr,logScaleAr=scanProducts(matAr)
+        alphaAr=alphaAr@prodAr[-1]
+        total=alphaAr.sum()
+        logLik+=float(logScaleAr[-1])+math.log(total)
+        alphaAr=alphaAr/total
+    return boundaryL,logLik
+
+def backwardChunks(kmerAr,transM,k,chunkSize,boundaryL):
+    """Generator over chunks, last to first, yielding (chunkStart,
+    alphaAr,betaAr,probAr). alphaAr and betaAr have one row per window
+    in the chunk plus a leading row for the position before it, each
+    row normalized to sum 1. probAr holds the transition probabilities
+    of each window by caseCode."""
+    numStates=2**k
+    betaAr=numpy.ones(numStates)/numStates
+    chunkStartL=list(range(0,len(kmerAr),chunkSize))
+    for chunkNum in range(len(chunkStartL)-1,-1,-1):
+        chunkStart=chunkStartL[chunkNum]
+        matAr,probAr=transitionMats(kmerAr[chunkStart:chunkStart+chunkSize],transM,k)
+        prefixAr,_=scanProducts(matAr)
+        suffixAr,_=scanProducts(matAr,reverse=True)
+        alphaStart=boundaryL[chunkNum]
+        chunkAlphaAr=numpy.empty((len(matAr)+1,numStates))
+        chunkAlphaAr[0]=alphaStart
+        chunkAlphaAr[1:]=numpy.einsum("s,jst->jt",alphaStart,prefixAr)
+        chunkBetaAr=numpy.empty((len(matAr)+1,numStates))
+        chunkBetaAr[-1]=betaAr
+        chunkBetaAr[:-1]=numpy.einsum("jst,t->js",suffixAr,betaAr)
+        chunkAlphaAr/=chunkAlphaAr.sum(axis=1,keepdims=True)
+        chunkBetaAr/=chunkBetaAr.sum(axis=1,keepdims=True)
+        betaAr=chunkBetaAr[0]
+        yield chunkStart,chunkAlphaAr,chunkBetaAr,probAr
+
+def forwardBackward(seq,transD,chunkSize=65536):
+    """Posterior decoding of seq under the CpG model given by the log
+    transition dictionary transD (any order k). Return an array with
+    the posterior probability that each position is in an island, and
+    the log of the summed score of all paths (the quantity Viterbi
+    maximizes, summed instead)."""
+    k=modelOrder(transD)
+    numStates=2**k
+    length=len(seq)
+    codeAr=fastViterbi.encodeSeq(seq)
+    postAr=numpy.full(length,0.5)
+    if length<k:
+        return postAr,0.0
+    transM=fastViterbi.transMatrix(transD)
+    kmerAr=fastViterbi.kmerCodes(codeAr,k)
+    islandAr=(numpy.arange(numStates)&1).astype(float)
+    boundaryL,logLik=forwardPass(kmerAr,transM,k,chunkSize)
+    firstStateAr=numpy.full(numStates,1.0/numStates)
+    for chunkStart,alphaAr,betaAr,probAr in backwardChunks(kmerAr,transM,k,chunkSize,boundaryL):
+        stateAr=alphaAr[1:]*betaAr[1:]
+        stateAr/=stateAr.sum(axis=1,keepdims=True)
+        postAr[k+chunkStart:k+chunkStart+len(stateAr)]=stateAr@islandAr
+        if chunkStart==0:
+            firstStateAr=alphaAr[0]*betaAr[0]
+            firstStateAr/=firstStateAr.sum()
+    # the state at k-1 holds the bits of all of the first k positions
+    for location in range(k):
+        bitAr=(numpy.arange(numStates)>>(k-1-location))&1
+        postAr[location]=firstStateAr@bitAr
+    return postAr,logLik
+
+def posteriorIntervals(postAr,threshold=0.5):
+    """Call islands where the island posterior exceeds threshold. Return
+    a list of (start,end,state,score) like fastViterbi.pathIntervals,
+    with score the mean posterior probability of state over the
+    interval, for use as a confidence score."""
+    pathAr=(postAr>threshold).astype(numpy.uint8)
+    cumAr=numpy.concatenate(([0.0],numpy.cumsum(postAr)))
+    outL=[]
+    for start,end,state in fastViterbi.pathIntervals(pathAr):
+        meanPost=(cumAr[end]-cumAr[start])/(end-start)
+        if state=="N":
+            meanPost=1-meanPost
+        outL.append((start,end,state,float(meanPost)))
+    return outL
+
+def expectedCounts(seq,transM,k,chunkSize=65536):
+    """Expected number of times each transition is used in seq, summed
+    over positions from the pairwise posteriors. Return an array the
+    shape of transM ([caseCode,baseCode]) and the log path sum."""
+    numStates=2**k
+    countAr=numpy.zeros(transM.size)
+    if len(seq)<=k:
+        return countAr.reshape(transM.shape),0.0
+    kmerAr=fastViterbi.kmerCodes(fastViterbi.encodeSeq(seq),k)
+    caseAr=numpy.arange(2*numStates)
+    boundaryL,logLik=forwardPass(kmerAr,transM,k,chunkSize)
+    for chunkStart,alphaAr,betaAr,probAr in backwardChunks(kmerAr,transM,k,chunkSize,boundaryL):
+        xiAr=alphaAr[:-1,caseAr>>1]*probAr*betaAr[1:,caseAr&(numStates-1)]
+        xiAr/=xiAr.sum(axis=1,keepdims=True)
+        kmerChunkAr=kmerAr[chunkStart:chunkStart+len(xiAr)]
+        flatAr=caseAr[None,:]*transM.shape[1]+kmerChunkAr[:,None]
+        countAr+=numpy.bincount(flatAr.ravel(),weights=xiAr.ravel(),minlength=transM.size)
+    return countAr.reshape(transM.shape),logLik
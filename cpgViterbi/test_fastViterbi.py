@@ -0,0 +1,74 @@
+import re
+import numpy
+import pytest
+import benchmark
+import fastViterbi
+from context import *
+
+def trainedModel(seed=0):
+    rng=numpy.random.default_rng(seed)
+    labeled=benchmark.synthSeq(50000,rng)
+    return logDictValues(fastContext([labeled],1,benchmark.STATES,1)[0]),rng
+
+def segmentIntervals(seq,transD):
+    """Expected calls: each ACGT stretch decoded on its own."""
+    outL=[]
+    for match in re.finditer("[ACGTacgt]+",seq):
+        finalScores,btAr=fastViterbi.fastViterbi(match.group(),transD)
+        pathAr=fastViterbi.tracePath(finalScores,btAr)
+        outL.extend(fastViterbi.pathIntervals(pathAr,match.start()))
+    return outL
+
+def chunks(seq,chunkSize):
+    return [seq[i:i+chunkSize] for i in range(0,len(seq),chunkSize)]
+
+def test_stream_matches_fastViterbi():
+    transD,rng=trainedModel()
+    seq=benchmark.synthSeq(30000,rng).upper()
+    finalScores,btAr=fastViterbi.fastViterbi(seq,transD)
+    expectedL=fastViterbi.fastBt(seq,finalScores,btAr,mode="intervals")
+    for chunkSize in (1,997,30000):
+        assert list(fastViterbi.streamViterbi(chunks(seq,chunkSize),transD))==expectedL
+
+def test_stream_skips_N_runs():
+    transD,rng=trainedModel(1)
+    body=benchmark.synthSeq(20000,rng).upper()
+    seq="N"*5000+body[:7000]+"NNNN"+body[7000:7001]+"RYN"+body[7001:]+"N"*300
+    expectedL=segmentIntervals(seq,transD)
+    for chunkSize in (1,1000,4999,5000,len(seq)):
+        intervalL=list(fastViterbi.streamViterbi(chunks(seq,chunkSize),transD))
+        assert intervalL==expectedL
+        assert all(type(start) is int and type(end) is int for start,end,state in intervalL)
+    assert list(fastViterbi.streamViterbi(["NNN","N"],transD))==[]
+
+def test_streamIslands_with_N(tmp_path):
+    transD,rng=trainedModel(2)
+    seqL=["N"*1200+benchmark.synthSeq(9000,rng).upper()+"N"*50,benchmark.synthSeq(3000,rng).upper()]
+    fileName=tmp_path/"test.fa"
+    with open(fileName,"w") as f:
+        for i,seq in enumerate(seqL):
+            print(">s"+str(i),file=f)
+            for line in chunks(seq,60):
+                print(line,file=f)
+    expectedL=[(">s"+str(i),)+interval for i,seq in enumerate(seqL) for interval in segmentIntervals(seq,transD)]
+    assert list(fastViterbi.streamIslands(str(fileName),transD,chunkSize=1000))==expectedL
+
+def test_order_decode_and_stream():
+    rng=numpy.random.default_rng(3)
+    labeled=benchmark.synthSeq(50000,rng)
+    seq=benchmark.synthSeq(20000,rng).upper()
+    gapped="NN"+seq[:8000]+"N"+seq[8000:8001]+"NN"+seq[8001:]
+    for k in (2,5):
+        transD=logDictValues(fastContext([labeled],k,benchmark.STATES,1)[0])
+        with pytest.raises(ValueError):
+            fastViterbi.fastViterbi(seq,transD)
+        finalScoreAr,btAr=fastViterbi.orderViterbi(seq,transD)
+        pathAr=fastViterbi.orderTracePath(finalScoreAr,btAr)
+        for blockSize in (1,997,65536):
+            assert fastViterbi.decode(seq,transD,blockSize=blockSize)==fastViterbi.applyPath(seq,pathAr)
+        expectedL=[]
+        for match in re.finditer("[ACGT]+",gapped):
+            finalScoreAr,btAr=fastViterbi.orderViterbi(match.group(),transD)
+            expectedL.extend(fastViterbi.pathIntervals(fastViterbi.orderTracePath(finalScoreAr,btAr),match.start()))
+        for chunkSize in (1,1000,len(gapped)):
+            assert list(fastViterbi.streamViterbi(chunks(gapped,chunkSize),transD))==expectedL
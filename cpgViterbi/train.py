@@ -0,0 +1,148 @@
+import math
+import multiprocessing
+import os
+import re
+import numpy
+import fasta
+import fastViterbi
+import posterior
+from context import *
+
+# Unsupervised re-estimation of the CpG model from unlabeled
+# sequence. Starting from a (log) transition dictionary, typically
+# trained on a labeled solution with context(), each iteration
+# decodes every record, sums expected (Baum-Welch) or Viterbi path
+# transition counts across a process pool and turns them back into a
+# transition dictionary. Records are split into segments of at most
+# segmentSize bases, and at any non ACGT character, which are treated
+# as independent sequences.
+
+STATES=["A","C","G","T","a","c","g","t"]
+
+workerTransD=None # set in each training worker by initTrainWorker
+workerMethod=None
+workerIndexD={} # open FastaIndex objects, by file name
+
+def initTrainWorker(transD,method):
+    """Pool initializer, store the current model once per worker."""
+    global workerTransD,workerMethod
+    workerTransD=transD
+    workerMethod=method
+
+def segmentCounts(task):
+    """Count transitions in the segment (fileName,name,start,end) under
+    the worker's model. Return a count dictionary keyed like transD and
+    the log path sum (0 for Viterbi training)."""
+    fileName,name,start,end=task
+    if fileName not in workerIndexD:
+        workerIndexD[fileName]=fasta.FastaIndex(fileName)
+    seq=workerIndexD[fileName].fetch(name,start,end)
+    k=len(next(iter(workerTransD)))-1
+    countD=dict.fromkeys(workerTransD,0.0)
+    logLik=0.0
+    if workerMethod=="baumWelch":
+        transM=fastViterbi.transMatrix(workerTransD)
+        countAr=numpy.zeros(transM.shape)
+        for match in re.finditer("[ACGTacgt]+",seq):
+            segCountAr,segLogLik=posterior.expectedCounts(match.group(),transM,k)
+            countAr+=segCountAr
+            logLik+=segLogLik
+        for key in countD:
+            caseCode,baseCode=keyCodes(key)
+            countD[key]=countAr[caseCode,baseCode]
+    else:
+        decodedL=[fastViterbi.decode(match.group(),workerTransD) for match in re.finditer("[ACGTacgt]+",seq)]
+        with numpy.errstate(invalid="ignore",divide="ignore"): # unused probs of unseen prefixes
+            countD=fastContext(decodedL,k,STATES,0)[1]
+    return countD,logLik
+
+def keyCodes(key):
+    """Return (caseCode,baseCode) of a transition key, as laid out by
+    fastViterbi.transMatrix."""
+    caseCode=0
+    baseCode=0
+    for char in key:
+        caseCode=caseCode*2+char.islower()
+        baseCode=baseCode*4+fastViterbi.NUCS.index(char.upper())
+    return caseCode,baseCode
+
+def countsToLogTransD(countD,pseudocount):
+    """Turn transition counts into a log transition dictionary, adding
+    pseudocount to every count as context does."""
+    originD={}
+    for key,count in countD.items():
+        originD[key[:-1]]=originD.get(key[:-1],0)+count+pseudocount
+    transD={}
+    for key,count in countD.items():
+        transD[key]=math.log((count+pseudocount)/originD[key[:-1]])
+    return transD
+
+def saveCheckpoint(fileName,transD,iteration,logLik):
+    """Write transD and the iteration reached to fileName, replacing it
+    only once fully written."""
+    f=open(fileName+".tmp","w")
+    print("#",iteration,repr(float(logLik)),sep="\t",file=f)
+    for key,val in transD.items():
+        print(key,repr(float(val)),sep="\t",file=f)
+    f.close()
+    os.replace(fileName+".tmp",fileName)
+
+def loadCheckpoint(fileName):
+    """Load a checkpoint written by saveCheckpoint, return
+    transD,iteration,logLik."""
+    f=open(fileName,"r")
+    _,iteration,logLik=f.readline().rstrip("\n").split("\t")
+    transD={}
+    for s in f:
+        key,val=s.rstrip("\n").split("\t")
+        transD[key]=float(val)
+    f.close()
+    return transD,int(iteration),float(logLik)
+
+def makeTasks(fileNameL,segmentSize):
+    """Split every record of every file into (fileName,name,start,end)
+    segments of at most segmentSize bases."""
+    taskL=[]
+    for fileName in fileNameL:
+        with fasta.FastaIndex(fileName) as fi:
+            for name in fi.names():
+                for start in range(0,fi.length(name),segmentSize):
+                    taskL.append((fileName,name,start,min(start+segmentSize,fi.length(name))))
+    return taskL
+
+def trainUnlabeled(fileNameL,transD,numIters=10,method="baumWelch",numWorkers=None,checkpointFileName=None,pseudocount=1,tol=None,segmentSize=10000000):
+    """Iteratively re-estimate the log transition dictionary transD
+    from the unlabeled fasta files in fileNameL. method is 'baumWelch'
+    (expected counts from forward-backward) or 'viterbi' (counts along
+    the best path). Counting is spread over numWorkers processes
+    (default one per core). If checkpointFileName is given the model is
+    saved there after each iteration, and training resumes from it if
+    it already exists. Stops early if the log path sum improves by less
+    than tol. Return the final transD and the list of log path sums
+    (Baum-Welch only)."""
+    if method not in ("baumWelch","viterbi"):
+        raise ValueError("method should be 'baumWelch' or 'viterbi'.")
+    startIter=0
+    if checkpointFileName is not None and os.path.exists(checkpointFileName):
+        transD,startIter,_=loadCheckpoint(checkpointFileName)
+    taskL=makeTasks(fileNameL,segmentSize)
+    logLikL=[]
+    for iteration in range(startIter,numIters):
+        totalD=dict.fromkeys(transD,0.0)
+        logLik=0.0
+        # leaving the with block terminates the pool, so an error does
+        # not wait for the remaining segments
+        with multiprocessing.Pool(numWorkers,initializer=initTrainWorker,initargs=(transD,method)) as pool:
+            # imap keeps the summation order, so runs are reproducible
+            for countD,segLogLik in pool.imap(segmentCounts,taskL):
+                for key,count in countD.items():
+                    totalD[key]+=count
+                logLik+=segLogLik
+        transD=countsToLogTransD(totalD,pseudocount)
+        if checkpointFileName is not None:
+            saveCheckpoint(checkpointFileName,transD,iteration+1,logLik)
+        if method=="baumWelch":
+            logLikL.append(logLik)
+            if tol is not None and len(logLikL)>1 and logLikL[-1]-logLikL[-2]<tol:
+                break
+    return transD,logLikL
@@ -6,31 +6,49 @@ from coalSim import *
 def alleleFreqs(hapDataL,chimpL):
     """Calculate the derived allele freq for every site in
     hapDataL. Return as list."""
-    freqL=[]
-    numSites=len(hapDataL[0])
-    numHaps=len(hapDataL)
-    for site in range(numSites):
-        allelesL=[]
-        chimp=chimpL[site]
-
-        for hap in range(numHaps):
-            allelesL.append(hapDataL[hap][site])
-
-        allelesPresentL=list(set(allelesL))
-
-        # we're only interested in sites with 2 alleles. skip
-        # 1's. There are no 3's in fin yor (and we'd skip them if
-        # there were).
-        if len(allelesPresentL)==2:
-            if allelesPresentL[0] == chimp:
-                derivedAllele = allelesPresentL[1]
-            else:
-                derivedAllele = allelesPresentL[0]
-            freq = float(allelesL.count(derivedAllele))/len(allelesL)
-            if freq != 0 and freq != 1: # skip the 0's and 1's
-                freqL.append(freq)
-
-    return freqL
+    # pack the tuples into a uint8 matrix and use the vectorized version
+    hapAr=numpy.frombuffer("".join("".join(hap) for hap in hapDataL).encode("ascii"),dtype=numpy.uint8).reshape(len(hapDataL),-1)
+    chimpAr=numpy.frombuffer("".join(chimpL).encode("ascii"),dtype=numpy.uint8)
+    return alleleFreqsNp(hapAr,chimpAr)
+
+def derivedAlleleCounts(hapAr,chimpAr):
+    """Count derived alleles at every site of a uint8 haplotype matrix
+    (haplotypes in rows) at once, taking chimpAr as ancestral. Return
+    derCountAr and a boolean array marking the sites where this is
+    well defined: monomorphic sites, and sites with two alleles one of
+    which is the chimp allele. Sites with three or more alleles, or two
+    alleles neither matching chimp, are marked unusable."""
+    numHaps=hapAr.shape[0]
+    sortedAr=numpy.sort(hapAr,axis=0)
+    numAllelesAr=1+(sortedAr[1:]!=sortedAr[:-1]).sum(axis=0)
+    ancCountAr=(hapAr==chimpAr).sum(axis=0)
+    derCountAr=numHaps-ancCountAr
+    usableAr=(numAllelesAr==1)|((numAllelesAr==2)&(ancCountAr>0))
+    return derCountAr,usableAr
+
+def alleleFreqsNp(hapAr,chimpAr):
+    """Derived allele frequencies of the segregating sites of a uint8
+    haplotype matrix, in site order, as alleleFreqs returns."""
+    derCountAr,usableAr=derivedAlleleCounts(hapAr,chimpAr)
+    numHaps=hapAr.shape[0]
+    segAr=usableAr&(derCountAr>0)&(derCountAr<numHaps)
+    return (derCountAr[segAr]/numHaps).tolist()
+
+def siteFreqSpectrum(hapAr,chimpAr):
+    """Unfolded site frequency spectrum: entry i is the number of usable
+    sites (see derivedAlleleCounts) with i derived alleles, for i from
+    0 to the number of haplotypes."""
+    derCountAr,usableAr=derivedAlleleCounts(hapAr,chimpAr)
+    return numpy.bincount(derCountAr[usableAr],minlength=hapAr.shape[0]+1)
+
+def spectraByPop(genoMatrixD):
+    """Site frequency spectra for a dictionary of GenotypeMatrix objects
+    (e.g. one per population or region), returned in a dictionary with
+    the same keys."""
+    sfsD={}
+    for key,genoM in genoMatrixD.items():
+        sfsD[key]=siteFreqSpectrum(genoM.hapAr,genoM.chimpAr)
+    return sfsD
 
 def lacPlots(hapDataL,chimpL):
     """Wrapper for plotting allele count histograms."""
@@ -57,6 +75,12 @@ def coalAlleleFreqs(hapL,numMuts):
             derAlleleFreqL.append(freq)
     return derAlleleFreqL
 
+def coalAlleleFreqsMatrix(hapAr):
+    """Allele freqs of a coalSimMatrix haplotype x mutation matrix, the
+    same list as coalAlleleFreqs, from one column sum."""
+    freqAr=hapAr.sum(axis=0)/hapAr.shape[0]
+    return freqAr[(freqAr!=0)&(freqAr!=1)].tolist()
+
 def coalHist(derAlleleFreqLL, numBins):
     """Takes a list of derived allele frequency lists. Calculates
     histograms for each, then plots a histogram with the average and
@@ -80,25 +104,37 @@ def coalHist(derAlleleFreqLL, numBins):
         meanL.append(numpy.mean(coalHistAr[:,i]))
         stderrL.append(stats.tsem(coalHistAr[:,i]))
 
+    plotHistBars(totBins,meanL,stderrL)
+
+def plotHistBars(totBins,meanL,stderrL):
+    """Bar plot of mean bin heights with standard error bars."""
     wid=(totBins[1]-totBins[0])
     pyplot.bar(totBins[:-1],meanL,width=wid,yerr=stderrL,color="gray")
 
-def coalPlots(popSize,numAlleles,numMuts,numReps):
-    """Wrapper for coalescent simulations."""
+def coalPlots(popSize,numAlleles,numMuts,numReps,seed=None,numWorkers=None):
+    """Wrapper for coalescent simulations. With a seed (or numWorkers),
+    replicates run on a process pool with independent, reproducible
+    random streams, and only per replicate histograms come back."""
 
     numBins=10
 
-    ## coalescent analysis
-    derAlleleFreqLL=[]
-
-    for i in range(numReps):
-        hapL=coalSim(numAlleles,popSize,numMuts) # numbers to match fin
-        derAlleleFreqL=coalAlleleFreqs(hapL,numMuts)
-        derAlleleFreqLL.append(derAlleleFreqL)
-
-    # plot mean of hists (with errorbars)
-    pyplot.figure()
-    coalHist(derAlleleFreqLL,numBins)
+    if seed is not None or numWorkers is not None:
+        meanAr,stderrAr=freqHistStats(popSize,numAlleles,numMuts,numReps,numBins,makeSeed(seed),numWorkers)
+        pyplot.figure()
+        spacer=1.0/numBins
+        plotHistBars([spacer*x for x in range(numBins+1)],meanAr,stderrAr)
+    else:
+        ## coalescent analysis
+        derAlleleFreqLL=[]
+
+        for i in range(numReps):
+            hapAr=coalSimMatrix(numAlleles,popSize,numMuts) # numbers to match fin
+            derAlleleFreqL=coalAlleleFreqsMatrix(hapAr)
+            derAlleleFreqLL.append(derAlleleFreqL)
+
+        # plot mean of hists (with errorbars)
+        pyplot.figure()
+        coalHist(derAlleleFreqLL,numBins)
 
     #pyplot.ylim(0,700)
     pyplot.title("Coalescent derived allele frequency histogram")
@@ -0,0 +1,200 @@
+import numpy
+
+# Array backed coalescent trees. A tree with numAlleles leaves has
+# 2*numAlleles-1 nodes, numbered as in coalSim.randomCoalescentTree:
+# leaves 0..numAlleles-1, then internal nodes in order of coalescence,
+# so the root is last. Trees are stored as flat arrays indexed by node
+# number (-1 where there is no parent or child).
+
+def randomCoalescentArrays(numAlleles,popSize,rng=None):
+    """Return a random coalescent tree as arrays parentAr, leftAr,
+    rightAr and timeAr (generations before present). All waiting times
+    and pair choices are drawn up front in a few batched calls to the
+    numpy Generator rng. Lineages are kept in a list with swap removal,
+    so each coalescence is O(1)."""
+    if rng is None:
+        rng=numpy.random.default_rng()
+    numNodes=2*numAlleles-1
+    linAr=numpy.arange(numAlleles,1,-1) # lineages before each coalescence
+    # geometric waiting times as in timeToNextCoalescence (p capped at 1
+    # for samples large relative to popSize)
+    pAr=numpy.minimum(linAr*(linAr-1)/(4.0*popSize),1.0)
+    timeAr=numpy.zeros(numNodes,dtype=numpy.int64)
+    timeAr[numAlleles:]=numpy.cumsum(rng.geometric(pAr))
+    # a uniform random pair of distinct positions among the lineages
+    firstL=rng.integers(linAr).tolist()
+    secondAr=rng.integers(linAr-1)
+    secondL=(secondAr+(secondAr>=firstL)).tolist()
+
+    parentL=[-1]*numNodes
+    leftL=[-1]*numNodes
+    rightL=[-1]*numNodes
+    activeL=list(range(numAlleles))
+    for event in range(numAlleles-1):
+        i=firstL[event]
+        j=secondL[event]
+        node=numAlleles+event
+        node1=activeL[i]
+        node2=activeL[j]
+        leftL[node]=node1
+        rightL[node]=node2
+        parentL[node1]=node
+        parentL[node2]=node
+        # new node takes the lower slot, the last lineage fills the upper
+        lo,hi=min(i,j),max(i,j)
+        activeL[lo]=node
+        activeL[hi]=activeL[-1]
+        activeL.pop()
+    return numpy.array(parentL),numpy.array(leftL),numpy.array(rightL),timeAr
+
+def branchLengths(parentAr,timeAr):
+    """Generations along the branch above each node (0 for the root)."""
+    lenAr=numpy.zeros(len(parentAr),dtype=numpy.int64)
+    hasParentAr=parentAr>=0
+    lenAr[hasParentAr]=timeAr[parentAr[hasParentAr]]-timeAr[hasParentAr]
+    return lenAr
+
+def arraysToTree(leftAr,rightAr,timeAr):
+    """Convert an array tree to the nested tuple form of
+    randomCoalescentTree, (nodeNum,leftTree,rightTree,time), without
+    recursion. Children always have lower node numbers than their
+    parent, so building in node order sees children first."""
+    leftL=leftAr.tolist()
+    rightL=rightAr.tolist()
+    timeL=timeAr.tolist()
+    treeL=[None]*len(leftL)
+    for node in range(len(leftL)):
+        if leftL[node]<0:
+            treeL[node]=(node,(),(),timeL[node])
+        else:
+            treeL[node]=(node,treeL[leftL[node]],treeL[rightL[node]],timeL[node])
+    return treeL[-1]
+
+def treeToArrays(Tree):
+    """Flatten a nested tuple tree (nodeNum,leftTree,rightTree,value)
+    into arrays indexed by node number, without recursion. Return
+    leftAr, rightAr (-1 at leaves), valueAr (the last field, a time or a
+    branch length) and preorderAr, the node numbers in the order the
+    recursive functions in coalSim visit them (node, left, right)."""
+    preorderL=[]
+    leftD={}
+    rightD={}
+    valueD={}
+    stack=[Tree]
+    while stack:
+        nodeNum,leftTree,rightTree,value=stack.pop()
+        preorderL.append(nodeNum)
+        valueD[nodeNum]=value
+        leftD[nodeNum]=leftTree[0] if leftTree!=() else -1
+        rightD[nodeNum]=rightTree[0] if rightTree!=() else -1
+        if rightTree!=():
+            stack.append(rightTree)
+        if leftTree!=():
+            stack.append(leftTree)
+    numNodes=max(preorderL)+1
+    leftAr=numpy.full(numNodes,-1)
+    rightAr=numpy.full(numNodes,-1)
+    valueAr=numpy.zeros(numNodes,dtype=numpy.int64)
+    nodeAr=numpy.array(preorderL)
+    leftAr[nodeAr]=[leftD[node] for node in preorderL]
+    rightAr[nodeAr]=[rightD[node] for node in preorderL]
+    valueAr[nodeAr]=[valueD[node] for node in preorderL]
+    return leftAr,rightAr,valueAr,nodeAr
+
+def parentArray(leftAr,rightAr):
+    """Parent of each node (-1 for the root and unused node numbers)."""
+    parentAr=numpy.full(len(leftAr),-1)
+    internalAr=numpy.flatnonzero(leftAr>=0)
+    parentAr[leftAr[internalAr]]=internalAr
+    parentAr[rightAr[internalAr]]=internalAr
+    return parentAr
+
+def buildTree(leftAr,rightAr,valueAr,preorderAr):
+    """Nested tuple tree from arrays, the inverse of treeToArrays.
+    Nodes are built in reverse preorder, so children come first."""
+    leftL=leftAr.tolist()
+    rightL=rightAr.tolist()
+    valueL=valueAr.tolist()
+    treeD={-1:()}
+    for node in reversed(preorderAr.tolist()):
+        treeD[node]=(node,treeD[leftL[node]],treeD[rightL[node]],valueL[node])
+    return treeD[preorderAr[0]]
+
+def leafPathMutations(leftAr,rightAr,preorderAr,branchMutL):
+    """Mutations on the path from the root to each leaf, root first,
+    for leaves in preorder. All paths share one buffer: each node
+    records the offset where its mutations start, and visiting it
+    truncates the buffer back to that offset, so ancestors' mutations
+    are never copied except into the output tuples."""
+    leftL=leftAr.tolist()
+    parentL=parentArray(leftAr,rightAr).tolist()
+    endD={-1:0} # buffer length after each node's mutations
+    pathL=[]
+    leafMutL=[]
+    for node in preorderAr.tolist():
+        del pathL[endD[parentL[node]]:]
+        pathL.extend(branchMutL[node])
+        endD[node]=len(pathL)
+        if leftL[node]<0:
+            leafMutL.append(tuple(pathL))
+    return leafMutL
+
+def placeMutations(branchLenAr,numMuts=None,rng=None,mutRate=None):
+    """Place mutations on branches with probability proportional to
+    branch length, in O(nodes) memory. Given numMuts, draw a uniform
+    generation among all branch generations and find its branch by
+    searchsorted on the cumulative lengths. Given mutRate instead, draw
+    a Poisson number of mutations (mean mutRate*length) per branch.
+    Return the node carrying each mutation, by mutation number."""
+    if rng is None:
+        rng=numpy.random.default_rng()
+    if mutRate is not None:
+        return numpy.repeat(numpy.arange(len(branchLenAr)),rng.poisson(mutRate*branchLenAr))
+    cumAr=numpy.cumsum(branchLenAr)
+    return numpy.searchsorted(cumAr,rng.integers(cumAr[-1],size=numMuts),side="right")
+
+def leafRanges(leftAr,rightAr,root=None):
+    """Order the leaves depth first and give each node the range of that
+    order lying below it. Return leafOrderAr, startAr and endAr, so the
+    leaves below node are leafOrderAr[startAr[node]:endAr[node]]. The
+    root defaults to the last node."""
+    leftL=leftAr.tolist()
+    rightL=rightAr.tolist()
+    startL=[0]*len(leftL)
+    endL=[0]*len(leftL)
+    leafOrderL=[]
+    if root is None:
+        root=len(leftL)-1
+    stack=[(root,False)]
+    while stack:
+        node,finished=stack.pop()
+        if finished:
+            endL[node]=len(leafOrderL)
+        else:
+            startL[node]=len(leafOrderL)
+            stack.append((node,True))
+            if leftL[node]<0:
+                leafOrderL.append(node)
+            else:
+                stack.append((rightL[node],False))
+                stack.append((leftL[node],False))
+    return numpy.array(leafOrderL,dtype=numpy.intp),numpy.array(startL),numpy.array(endL)
+
+def hapMatrixFromArrays(leftAr,rightAr,mutNodeAr,numAlleles,root=None):
+    """Boolean haplotype x mutation matrix for mutations on the nodes in
+    mutNodeAr: row i (leaf i) is True for each mutation above it."""
+    leafOrderAr,startAr,endAr=leafRanges(leftAr,rightAr,root)
+    hapAr=numpy.zeros((numAlleles,len(mutNodeAr)),dtype=bool)
+    for mut,node in enumerate(mutNodeAr.tolist()):
+        hapAr[leafOrderAr[startAr[node]:endAr[node]],mut]=True
+    return hapAr
+
+def coalSimArrays(numAlleles,popSize,numMuts=None,rng=None,mutRate=None):
+    """One coalescent simulation entirely on arrays: tree, mutation
+    placement (a fixed numMuts or Poisson with mutRate, see
+    placeMutations) and the haplotype x mutation matrix."""
+    if rng is None:
+        rng=numpy.random.default_rng()
+    parentAr,leftAr,rightAr,timeAr=randomCoalescentArrays(numAlleles,popSize,rng)
+    mutNodeAr=placeMutations(branchLengths(parentAr,timeAr),numMuts,rng,mutRate)
+    return hapMatrixFromArrays(leftAr,rightAr,mutNodeAr,numAlleles)
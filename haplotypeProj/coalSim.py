@@ -1,6 +1,9 @@
-import numpy, random
+import bisect, numpy, random
 from scipy import stats
 from lacData import *
+from hapCounts import *
+from coalArrays import *
+from replicates import *
 from alleleHist import *
 
 def timeToNextCoalescence(numAlleles,popSize):
@@ -41,56 +44,52 @@ def convertToGensPerBranch(Tree, parentGensBeforePresent):
     """Converts variant 1 tree to variant 2 tree"""
 
     # Base case: tree is empty
-    newTree = ()
     if Tree == ():
-        return newTree
-    
-    # otherwise, find branchGens and then recurse through the tree
-    else:
-        nodeNum, leftTree, rightTree, totGensBeforePresent = Tree
-        branchGens = parentGensBeforePresent - totGensBeforePresent
-        newTree = (nodeNum, convertToGensPerBranch(leftTree, totGensBeforePresent), convertToGensPerBranch(rightTree, totGensBeforePresent), branchGens)
-        return newTree
+        return ()
+
+    # otherwise, subtract each node's time from its parent's
+    leftAr, rightAr, timeAr, preorderAr = treeToArrays(Tree)
+    parentAr = parentArray(leftAr, rightAr)
+    branchGensAr = timeAr[parentAr] - timeAr
+    branchGensAr[preorderAr[0]] = parentGensBeforePresent - timeAr[preorderAr[0]]
+    return buildTree(leftAr, rightAr, branchGensAr, preorderAr)
 
 def getBranchProportionList(Tree):
 
     """Returns a list of the node numbers proportional to the length of the branches"""
 
-    propList = []
     # Base case tree is nan empty tree
     if Tree == ():
-        return propList
-    
-    # Otherwise add nto propList the nodeNum branchGens times, then rescurse
-    else:
-        nodeNum, leftTree, rightTree, branchGens = Tree
-        for i in range(branchGens):
-            propList.append(nodeNum)
-        propList.extend(getBranchProportionList(leftTree))
-        propList.extend(getBranchProportionList(rightTree))  
-        return propList
+        return []
+
+    # Otherwise each node appears branchGens times, in preorder
+    leftAr, rightAr, branchGensAr, preorderAr = treeToArrays(Tree)
+    return numpy.repeat(preorderAr, numpy.maximum(branchGensAr[preorderAr], 0)).tolist()
     
 def findNumNodes(Tree):
     """Helper function for assignMutsToBranch. Finds the number of nodes in the tree"""
 
     if not Tree or Tree == ():
         return 0
-    
-    else:
-        nodeNum, leftTree, rightTree, branchGens = Tree
-        left_count = findNumNodes(leftTree)
-        right_count = findNumNodes(rightTree)
-        return 1 + left_count + right_count
+
+    return len(treeToArrays(Tree)[3])
     
 def assignMutsToBranch(Tree, numMuts):
 
     """Assigns mutations randomly to branches of the tree"""
 
-    size = findNumNodes(Tree)
-    mutList = [[] for _ in range(size)]
-    propList = getBranchProportionList(Tree)
+    # Pick a uniform generation among all branch generations, laid out
+    # in the same (preorder) order as getBranchProportionList, and find
+    # its branch by bisecting the cumulative lengths. This draws the
+    # same random numbers as random.choice(propList) without building it
+    leftAr, rightAr, branchGensAr, preorderAr = treeToArrays(Tree)
+    mutList = [[] for _ in range(len(preorderAr))]
+    nodeAr = preorderAr[branchGensAr[preorderAr] > 0]
+    nodeL = nodeAr.tolist()
+    cumGensL = numpy.cumsum(branchGensAr[nodeAr]).tolist()
+    totGens = cumGensL[-1]
     for i in range(numMuts):
-        index = random.choice(propList)
+        index = nodeL[bisect.bisect_right(cumGensL, random.randrange(totGens))]
         mutList[index].append(i)
     return mutList
     
@@ -98,22 +97,36 @@ def createSeqs(Tree, branchMutL, seqT):
 
     """Creates sequences or haplotypes based on the mutations along the branches"""
 
-    nodeNum, leftTree, rightTree, branchGens = Tree
-    tupList = []
-    muts = branchMutL[nodeNum]
-    for mut in muts:
-        seqT += (mut,)
+    # each leaf gets seqT plus the mutations on its path from the root,
+    # leaves in the same left to right order as before
+    leftAr, rightAr, branchGensAr, preorderAr = treeToArrays(Tree)
+    return [seqT + muts for muts in leafPathMutations(leftAr, rightAr, preorderAr, branchMutL)]
+
+def createHapMatrix(Tree, branchMutL, numAlleles, numMuts):
+
+    """Like createSeqs, but return a boolean haplotype x mutation matrix,
+    with row i for leaf node i and column m True if it carries mutation m"""
 
-    # Base case: Tree is a leaf node
-    if leftTree == () and rightTree == ():
-        tupList.append(seqT)
-        return tupList
+    leftAr, rightAr, branchGensAr, preorderAr = treeToArrays(Tree)
+    mutNodeAr = numpy.zeros(numMuts, dtype=numpy.intp)
+    for nodeNum, muts in enumerate(branchMutL):
+        mutNodeAr[muts] = nodeNum
+    return hapMatrixFromArrays(leftAr, rightAr, mutNodeAr, numAlleles, preorderAr[0])
 
-    # Otherwise, extend the tupList
-    else:
-        tupList.extend(createSeqs(leftTree, branchMutL, seqT))
-        tupList.extend(createSeqs(rightTree, branchMutL, seqT))
-        return tupList
+def coalSimMatrix(numAlleles,popSize,numMuts,rng=None):
+
+    """One coalescent simulation, returned as a haplotype x mutation
+    boolean matrix (see createHapMatrix). If a numpy Generator rng is
+    given, the whole simulation runs on the array backend in coalArrays,
+    which handles samples of 10^4-10^5 alleles"""
+
+    if rng is not None:
+        return coalSimArrays(numAlleles,popSize,numMuts,rng)
+    Tree = randomCoalescentTree(numAlleles,popSize)
+    timeOfFinalCoalescence=Tree[-1]
+    Tree = convertToGensPerBranch(Tree, timeOfFinalCoalescence)
+    branchMutL = assignMutsToBranch(Tree, numMuts)
+    return createHapMatrix(Tree, branchMutL, numAlleles, numMuts)
 
 def coalSim(numAlleles,popSize,numMuts):
 
@@ -125,17 +138,17 @@ def coalSim(numAlleles,popSize,numMuts):
     branchMutL = assignMutsToBranch(Tree, numMuts)
     return createSeqs(Tree, branchMutL, ())
 
-def runCoalSim(popSize,numAlleles,numMuts,numReps,maxHapCountRealData):
+def runCoalSim(popSize,numAlleles,numMuts,numReps,maxHapCountRealData,seed=None,numWorkers=None):
     
-    """wrapper function to run mutliple simulations"""
+    """wrapper function to run mutliple simulations. With a seed (or
+    numWorkers), replicates run on a process pool with independent,
+    reproducible random streams (see replicates.py)"""
 
+    if seed is not None or numWorkers is not None:
+        return countMaxHapExceeding(popSize,numAlleles,numMuts,numReps,maxHapCountRealData,makeSeed(seed),numWorkers)
     simList = []
     for i in range(numReps):
-        simulation = coalSim(numAlleles,popSize,numMuts)
-        unique = list(set(simulation))
-        simHapCounts = []
-        for elem in unique:
-            simHapCounts.append(len([tup for tup in simulation if tup == elem]))
-        simList.append(max(simHapCounts))
+        hapAr = coalSimMatrix(numAlleles,popSize,numMuts)
+        # pack each haplotype's bits into bytes before hashing rows
+        simList.append(max(hapRowCounts(numpy.packbits(hapAr, axis=1)).values()))
     return len([count for count in simList if count > maxHapCountRealData])
-
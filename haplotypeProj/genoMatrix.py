@@ -0,0 +1,79 @@
+import numpy
+
+# Shared loader for the by-site variant files (CHROM POS ID REF CHIMP
+# followed by one "a,b" diploid genotype per sample). Alleles are kept
+# as their ASCII codes in a uint8 haplotypes x sites matrix, with site
+# metadata in parallel arrays.
+
+class GenotypeMatrix:
+    """Haplotype data for one population. hapAr is a uint8 array of
+    shape (numHaps,numSites) holding allele ASCII codes; the two
+    haplotypes of sample i are rows 2i and 2i+1. chrAr, posAr, idAr,
+    refAr and chimpAr give per site metadata (chimpAr as ASCII codes,
+    like hapAr)."""
+
+    def __init__(self,sampleNamesL,hapAr,chrAr,posAr,idAr,refAr,chimpAr):
+        if hapAr.shape!=(2*len(sampleNamesL),len(posAr)):
+            raise ValueError("hapAr should have two rows per sample and one column per site.")
+        self.sampleNamesL=sampleNamesL
+        self.hapAr=hapAr
+        self.chrAr=chrAr
+        self.posAr=posAr
+        self.idAr=idAr
+        self.refAr=refAr
+        self.chimpAr=chimpAr
+
+    def hapNames(self):
+        """Return haplotype names in row order, as getDataByHaplotype."""
+        hapNamesL=[]
+        for sampleName in self.sampleNamesL:
+            hapNamesL.append(sampleName+".A")
+            hapNamesL.append(sampleName+".B")
+        return hapNamesL
+
+    def hapTuples(self):
+        """Return the haplotypes as a list of tuples of single character
+        strings, the hapDataL format used elsewhere."""
+        return [tuple(row.tobytes().decode("ascii")) for row in self.hapAr]
+
+    def chimpList(self):
+        """Return chimp alleles at each site as a list of strings."""
+        return list(self.chimpAr.tobytes().decode("ascii"))
+
+    def siteIndex(self,ID):
+        """Return the column of the site with the given ID."""
+        idxAr=numpy.flatnonzero(self.idAr==ID)
+        if len(idxAr)==0:
+            raise ValueError("No site with ID "+ID+".")
+        return int(idxAr[0])
+
+def loadGenotypeMatrix(fileName):
+    """Load a by-site variant file into a GenotypeMatrix. Assumes single
+    character alleles, so every genotype field is 'a,b'."""
+    f=open(fileName,"rb")
+    sampleNamesL=f.readline().decode("ascii").split()[5:]
+    rowLen=4*len(sampleNamesL)-1 # "a,b\t" per sample, less the last tab
+    chrL=[]
+    posL=[]
+    idL=[]
+    refL=[]
+    chimpL=[]
+    genoL=[]
+    for s in f:
+        strL=s.rstrip(b"\r\n").split(b"\t",5)
+        if len(strL)<6 or len(strL[5])!=rowLen:
+            f.close()
+            raise ValueError("Line "+str(len(posL)+2)+" of "+fileName+" is not in the expected format.")
+        chrL.append(strL[0].decode("ascii"))
+        posL.append(int(strL[1]))
+        idL.append(strL[2].decode("ascii"))
+        refL.append(strL[3].decode("ascii"))
+        chimpL.append(strL[4])
+        genoL.append(strL[5])
+    f.close()
+    # alleles sit at every other byte of each genotype row
+    siteAr=numpy.frombuffer(b"".join(genoL),dtype=numpy.uint8).reshape(len(genoL),rowLen)[:,0::2]
+    hapAr=numpy.ascontiguousarray(siteAr.T)
+    chimpAr=numpy.frombuffer(b"".join(chimpL),dtype=numpy.uint8).copy()
+    return GenotypeMatrix(sampleNamesL,hapAr,numpy.array(chrL),numpy.array(posL,dtype=numpy.int64),
+                          numpy.array(idL),numpy.array(refL),chimpAr)
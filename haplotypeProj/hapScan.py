@@ -0,0 +1,166 @@
+import numpy
+from genoMatrix import *
+
+# Haplotype homozygosity scans over a uint8 haplotype matrix (rows are
+# haplotypes, columns sites, as in GenotypeMatrix.hapAr).
+
+HASHSEED=20170531 # seeds the random site weights of windowScan's hashes
+
+def homozygosity(countAr):
+    """Probability that two haplotypes drawn without replacement are
+    identical, given the counts of each distinct haplotype."""
+    total=countAr.sum()
+    if total<2:
+        return float("nan")
+    return float((countAr*(countAr-1)).sum())/(total*(total-1))
+
+def windowScan(hapAr,windowSize,step=1):
+    """Slide a window of windowSize sites along hapAr, moving step sites
+    at a time. Each haplotype's window is summarized by two independent
+    64 bit hashes, sums mod 2**64 of its alleles times random per site
+    weights, updated in O(numHaps) as one site enters and one leaves.
+    Haplotypes are grouped by the pair of hashes, sorting on the first
+    and on both only when equal first hashes have different second
+    ones. Two different windows get the same hash only if the weighted
+    sum of their allele differences is 0 mod 2**64, which for random
+    weights has probability at most 2**(v-64), where 2**v is the
+    largest power of 2 dividing an allele difference (v<=2 for A, C, G
+    and T). Distinct haplotypes thus share a group with probability
+    below 2**-124 per pair, whatever the alleles look like.
+    Return a dictionary of arrays, one entry per window: startAr (first
+    site), numDistinctAr, maxCountAr and homozygosityAr."""
+    numHaps,numSites=hapAr.shape
+    if windowSize<1 or windowSize>numSites:
+        raise ValueError("windowSize should be between 1 and the number of sites.")
+    weightAr=numpy.random.default_rng(HASHSEED).integers(2**64,size=(2,numSites),dtype=numpy.uint64)
+    hashAr=numpy.zeros((2,numHaps),dtype=numpy.uint64)
+    startL=[]
+    numDistinctL=[]
+    maxCountL=[]
+    homL=[]
+    for site in range(numSites):
+        if site>=windowSize:
+            hashAr-=numpy.outer(weightAr[:,site-windowSize],hapAr[:,site-windowSize])
+        hashAr+=numpy.outer(weightAr[:,site],hapAr[:,site])
+        start=site-windowSize+1
+        if start>=0 and start%step==0:
+            sortedAr=hashAr[:,numpy.argsort(hashAr[0])]
+            diffAr=sortedAr[:,1:]!=sortedAr[:,:-1]
+            if (diffAr[1]&~diffAr[0]).any(): # equal first hashes, different second ones
+                sortedAr=hashAr[:,numpy.lexsort(hashAr)]
+                diffAr=sortedAr[:,1:]!=sortedAr[:,:-1]
+            newAr=diffAr[0]|diffAr[1]
+            countAr=numpy.diff(numpy.flatnonzero(numpy.concatenate(([True],newAr,[True]))))
+            startL.append(start)
+            numDistinctL.append(len(countAr))
+            maxCountL.append(int(countAr.max()))
+            homL.append(homozygosity(countAr))
+    return {"startAr":numpy.array(startL),"numDistinctAr":numpy.array(numDistinctL),
+            "maxCountAr":numpy.array(maxCountL),"homozygosityAr":numpy.array(homL)}
+
+def focalWindowScan(hapAr,focalIdx,windowSize):
+    """windowScan over just the windows of windowSize sites that contain
+    the site focalIdx."""
+    lo=max(0,focalIdx-windowSize+1)
+    hi=min(hapAr.shape[1],focalIdx+windowSize)
+    resD=windowScan(hapAr[:,lo:hi],windowSize)
+    resD["startAr"]=resD["startAr"]+lo
+    return resD
+
+def ehhSide(coreAr,siteL,cutoff=0):
+    """EHH of the haplotypes in coreAr (rows of a haplotype matrix) as
+    sites are added in the order given by siteL. Return an array whose
+    entry d is the EHH over the core site plus the first d sites,
+    ending at the first value below cutoff.
+
+    Sorting the haplotypes lexicographically over siteL puts identical
+    prefixes next to each other, so at extension d the groups of
+    identical haplotypes are runs of neighbours sharing at least d
+    leading sites. Joining neighbours in decreasing order of shared
+    prefix length, and adding a*b identical pairs whenever runs of
+    sizes a and b join, gives EHH at every d from one sort."""
+    numHaps=len(coreAr)
+    numExt=len(siteL)
+    if numHaps<2:
+        return numpy.array([float("nan")])
+    if numExt==0:
+        return numpy.array([1.0])
+    subAr=coreAr[:,siteL]
+    sortedAr=subAr[numpy.lexsort(subAr.T[::-1])] # first site is the primary key
+    neqAr=sortedAr[1:]!=sortedAr[:-1]
+    prefixAr=numpy.where(neqAr.any(axis=1),neqAr.argmax(axis=1),numExt)
+
+    # union neighbouring runs; runEnd/runStart are kept valid at run ends
+    runStartL=list(range(numHaps))
+    runEndL=list(range(numHaps))
+    orderAr=numpy.argsort(-prefixAr,kind="stable")
+    gainL=[]
+    for i in orderAr.tolist():
+        start=runStartL[i]
+        end=runEndL[i+1]
+        gainL.append((i-start+1)*(end-i))
+        runEndL[start]=end
+        runStartL[end]=start
+    sameAr=numpy.cumsum(gainL) # identical pairs after each join
+    # joins whose shared prefix is at least d, for d=0..numExt
+    numJoinedAr=numpy.searchsorted(-prefixAr[orderAr],-numpy.arange(numExt+1),side="right")
+    sameAr=numpy.concatenate(([0],sameAr))[numJoinedAr]
+    ehhAr=sameAr/(numHaps*(numHaps-1)/2)
+    belowAr=numpy.flatnonzero(ehhAr<cutoff)
+    return ehhAr[:belowAr[0]+1] if len(belowAr) else ehhAr
+
+def ehh(hapAr,focalIdx,maxSites=None,cutoff=0):
+    """Extended haplotype homozygosity around the site focalIdx. For
+    each allele present there, return (leftAr,rightAr), the EHH of the
+    haplotypes carrying it extending 0,1,2... sites to the left and
+    right (up to maxSites, or until EHH drops below cutoff). Result is
+    a dictionary keyed by allele character."""
+    numSites=hapAr.shape[1]
+    if maxSites is None:
+        maxSites=numSites
+    leftL=list(range(focalIdx-1,max(focalIdx-maxSites,0)-1,-1))
+    rightL=list(range(focalIdx+1,min(focalIdx+maxSites,numSites-1)+1))
+    outD={}
+    for allele in numpy.unique(hapAr[:,focalIdx]):
+        coreAr=hapAr[hapAr[:,focalIdx]==allele]
+        outD[chr(allele)]=(ehhSide(coreAr,leftL,cutoff),ehhSide(coreAr,rightL,cutoff))
+    return outD
+
+def integrateEhh(ehhAr,distAr,cutoff):
+    """Trapezoid integral of EHH over physical distance from the focal
+    site, stopping where EHH first drops below cutoff."""
+    belowAr=numpy.flatnonzero(ehhAr<cutoff)
+    stop=belowAr[0]+1 if len(belowAr) else len(ehhAr)
+    ehhAr=ehhAr[:stop]
+    distAr=distAr[:len(ehhAr)]
+    return float(((ehhAr[1:]+ehhAr[:-1])/2*numpy.diff(distAr)).sum())
+
+def ihs(genoM,focalIdx,cutoff=0.05):
+    """Unstandardized iHS at focalIdx: ln(iHH ancestral/iHH derived),
+    with the ancestral allele taken from chimp. Integrals run until EHH
+    falls below cutoff or the region ends. Return nan unless the site
+    has exactly the chimp allele and one derived allele."""
+    ehhD=ehh(genoM.hapAr,focalIdx,cutoff=cutoff)
+    ancestral=chr(genoM.chimpAr[focalIdx])
+    if len(ehhD)!=2 or ancestral not in ehhD:
+        return float("nan")
+    derived=[allele for allele in ehhD if allele!=ancestral][0]
+    posAr=genoM.posAr
+    iHHD={}
+    for allele in (ancestral,derived):
+        leftAr,rightAr=ehhD[allele]
+        leftDistAr=posAr[focalIdx]-posAr[focalIdx::-1]
+        rightDistAr=posAr[focalIdx:]-posAr[focalIdx]
+        iHHD[allele]=integrateEhh(leftAr,leftDistAr,cutoff)+integrateEhh(rightAr,rightDistAr,cutoff)
+    if iHHD[ancestral]==0 or iHHD[derived]==0:
+        return float("nan")
+    return float(numpy.log(iHHD[ancestral]/iHHD[derived]))
+
+def ihsScan(genoM,minFreq=0.05,cutoff=0.05):
+    """Unstandardized iHS at every site whose derived allele frequency
+    is at least minFreq and at most 1-minFreq. Return arrays of site
+    indexes and iHS values."""
+    numHaps=genoM.hapAr.shape[0]
+    derFreqAr=(genoM.hapAr!=genoM.chimpAr).sum(axis=0)/numHaps
+    siteAr=numpy.flatnonzero((derFreqAr>=minFreq)&(derFreqAr<=1-minFreq))
+    return siteAr,numpy.array([ihs(genoM,site,cutoff) for site in siteAr])
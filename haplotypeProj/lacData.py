@@ -1,3 +1,6 @@
+import os
+from genoMatrix import *
+
 
 def loadSiteVariantData(fileName):
     """Load our variant data in its by site form."""
@@ -67,17 +70,49 @@ def getChimp(siteDataL):
         chimpL.append(chimp)
     return chimpL
 
-finSampleNamesL,finSiteDataL=loadSiteVariantData("fin-2.136445439-136692143.tsv")
-yorSampleNamesL,yorSiteDataL=loadSiteVariantData("yor-2.136445439-136692143.tsv")
-
-chimpL = getChimp(finSiteDataL) # will be same for fin and yor
-
-# convert to hap based
-finHapNamesL,finHapDataL=getDataByHaplotype(finSampleNamesL,finSiteDataL)
-yorHapNamesL,yorHapDataL=getDataByHaplotype(yorSampleNamesL,yorSiteDataL)
-
-del finSampleNamesL
-del finSiteDataL
-del yorSampleNamesL
-del yorSiteDataL
-
+class LacDataset:
+    """Variant data for a set of populations, keyed by population name.
+    Each population's file is parsed into a GenotypeMatrix the first
+    time its data is asked for, and cached after that."""
+
+    def __init__(self,fileNameD):
+        self.fileNameD=fileNameD
+        self.matrixD={} # population -> GenotypeMatrix
+        self.hapD={} # population -> (hapNamesL,hapDataL), only if asked for
+
+    def matrix(self,pop):
+        """Return the GenotypeMatrix for population pop."""
+        if pop not in self.matrixD:
+            self.matrixD[pop]=loadGenotypeMatrix(self.fileNameD[pop])
+        return self.matrixD[pop]
+
+    def hapData(self,pop):
+        """Return hapNamesL,hapDataL for population pop."""
+        if pop not in self.hapD:
+            genoM=self.matrix(pop)
+            self.hapD[pop]=(genoM.hapNames(),genoM.hapTuples())
+        return self.hapD[pop]
+
+    def chimp(self,pop=None):
+        """Return chimp alleles at each site (the same for every
+        population, so by default from whichever is already loaded)."""
+        if pop is None:
+            pop=next(iter(self.matrixD),next(iter(self.fileNameD)))
+        return self.matrix(pop).chimpList()
+
+dataDir=os.path.dirname(os.path.abspath(__file__))
+lacDataset=LacDataset({"fin":os.path.join(dataDir,"fin-2.136445439-136692143.tsv"),
+                       "yor":os.path.join(dataDir,"yor-2.136445439-136692143.tsv")})
+
+# The old module level names (lacData.finHapDataL etc.) still work, but
+# are only loaded when first used.
+legacyNameD={"finHapNamesL":("fin",0),"finHapDataL":("fin",1),
+             "yorHapNamesL":("yor",0),"yorHapDataL":("yor",1)}
+
+def __getattr__(name):
+    if name=="chimpL":
+        return lacDataset.chimp()
+    if name in legacyNameD:
+        pop,i=legacyNameD[name]
+        return lacDataset.hapData(pop)[i]
+    raise AttributeError("module 'lacData' has no attribute '"+name+"'")
@@ -0,0 +1,80 @@
+import multiprocessing
+import numpy
+from coalArrays import *
+from hapCounts import hapRowCounts
+
+# Reproducible replicate runner. Replicate i of a run with seed s
+# always gets the Generator seeded by SeedSequence(s,spawn_key=(i,)),
+# which is the i-th child of SeedSequence(s).spawn, so results depend
+# only on (s,i) and not on the number of workers or how replicates are
+# split across runs or machines.
+
+def makeSeed(seed=None):
+    """Return an integer seed, fresh entropy if seed is None. Record it
+    to reproduce a run."""
+    return numpy.random.SeedSequence(seed).entropy
+
+def replicateRng(seed,repNum):
+    return numpy.random.default_rng(numpy.random.SeedSequence(seed,spawn_key=(repNum,)))
+
+def runTask(task):
+    repFunc,argsT,seed,repNum=task
+    return repNum,repFunc(replicateRng(seed,repNum),*argsT)
+
+def runReplicates(repFunc,argsT,numReps,seed,numWorkers=None,firstRep=0,chunkSize=16):
+    """Generator yielding (repNum,repFunc(rng,*argsT)) for replicates
+    firstRep..firstRep+numReps-1, each with its own spawned rng (see
+    replicateRng). Replicates run on a pool of numWorkers processes
+    (default one per core, 1 runs in this process) and results are
+    yielded as they finish, so callers can aggregate incrementally.
+    repFunc must be a module level function so it can be pickled."""
+    taskIter=((repFunc,argsT,seed,repNum) for repNum in range(firstRep,firstRep+numReps))
+    if numWorkers==1:
+        for task in taskIter:
+            yield runTask(task)
+        return
+    # leaving the with block terminates the pool, so an error or a
+    # caller closing the generator early does not run queued replicates
+    with multiprocessing.Pool(numWorkers) as pool:
+        for result in pool.imap_unordered(runTask,taskIter,chunksize=chunkSize):
+            yield result
+
+## per replicate summaries
+
+def maxHapCountRep(rng,numAlleles,popSize,numMuts):
+    """Count of the most common haplotype in one simulation."""
+    hapAr=coalSimArrays(numAlleles,popSize,numMuts,rng)
+    return max(hapRowCounts(numpy.packbits(hapAr,axis=1)).values())
+
+def freqHistRep(rng,numAlleles,popSize,numMuts,numBins):
+    """Histogram (numBins equal bins on [0,1]) of the derived allele
+    frequencies of the segregating mutations in one simulation."""
+    hapAr=coalSimArrays(numAlleles,popSize,numMuts,rng)
+    freqAr=hapAr.sum(axis=0)/numAlleles
+    freqAr=freqAr[(freqAr!=0)&(freqAr!=1)]
+    spacer=1.0/numBins
+    return numpy.histogram(freqAr,[spacer*x for x in range(numBins+1)])[0]
+
+## aggregated runs
+
+def countMaxHapExceeding(popSize,numAlleles,numMuts,numReps,maxHapCountRealData,seed,numWorkers=None,firstRep=0):
+    """Number of replicates whose max haplotype count exceeds
+    maxHapCountRealData."""
+    count=0
+    for repNum,maxCount in runReplicates(maxHapCountRep,(numAlleles,popSize,numMuts),numReps,seed,numWorkers,firstRep):
+        if maxCount>maxHapCountRealData:
+            count+=1
+    return count
+
+def freqHistStats(popSize,numAlleles,numMuts,numReps,numBins,seed,numWorkers=None,firstRep=0):
+    """Mean and standard error (as scipy.stats.tsem) of each histogram
+    bin height over replicates, accumulated from running integer sums
+    so the result does not depend on completion order."""
+    sumAr=numpy.zeros(numBins,dtype=numpy.int64)
+    sumSqAr=numpy.zeros(numBins,dtype=numpy.int64)
+    for repNum,histAr in runReplicates(freqHistRep,(numAlleles,popSize,numMuts,numBins),numReps,seed,numWorkers,firstRep):
+        sumAr+=histAr
+        sumSqAr+=histAr*histAr
+    meanAr=sumAr/numReps
+    varAr=(sumSqAr-sumAr*meanAr)/(numReps-1) if numReps>1 else numpy.full(numBins,numpy.nan)
+    return meanAr,numpy.sqrt(numpy.maximum(varAr,0)/numReps)
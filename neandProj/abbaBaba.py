@@ -0,0 +1,137 @@
+import numpy
+
+# Vectorized ABBA-BABA counting for fourPopTest. Each population is held
+# as a sites x alleles uint8 matrix of ASCII codes (padded with 0 where
+# a site has fewer alleles) plus the number of alleles at each site, so
+# a random allele per site for many replicates at once is one integer
+# draw and one gather.
+
+def alleleMatrix(alleleLL):
+    """Convert a list (one entry per site) of allele lists or strings to
+    (alleleAr,countAr): a sites x maxAlleles uint8 matrix of ASCII codes
+    and the number of alleles at each site."""
+    countAr=numpy.array([len(alleleL) for alleleL in alleleLL],dtype=numpy.int64)
+    alleleAr=numpy.zeros((len(alleleLL),countAr.max() if len(alleleLL) else 0),dtype=numpy.uint8)
+    for i,alleleL in enumerate(alleleLL):
+        alleleAr[i,:countAr[i]]=numpy.frombuffer("".join(alleleL).encode(),dtype=numpy.uint8)
+    return alleleAr,countAr
+
+def siteMatrix(siteDataL):
+    """Matrices for a list of (Chr,pos,chimp,allelesL) tuples as made by
+    fourPopTest.loadModernHumanData. Return chimpAr (uint8, one per
+    site) and the (alleleAr,countAr) pair from alleleMatrix."""
+    chimpAr=numpy.frombuffer("".join(site[2] for site in siteDataL).encode(),dtype=numpy.uint8)
+    return chimpAr,alleleMatrix([site[3] for site in siteDataL])
+
+def neandMatrix(neandReadD,siteDataL):
+    """(alleleAr,countAr) of Neanderthal reads at the sites of siteDataL."""
+    return alleleMatrix([neandReadD[site[0],site[1]] for site in siteDataL])
+
+def pickAlleles(alleleMat,numReps,rng):
+    """One uniformly random allele per site for each of numReps
+    replicates, as a numReps x sites uint8 matrix."""
+    alleleAr,countAr=alleleMat
+    # floor of a uniform times the count is a uniform column, and is
+    # faster than rng.integers with per site bounds
+    colAr=(rng.random((numReps,len(countAr)))*countAr).astype(numpy.intp)
+    return alleleAr[numpy.arange(len(countAr)),colAr]
+
+def subsetMatrix(alleleMat,keepAr):
+    alleleAr,countAr=alleleMat
+    return alleleAr[keepAr],countAr[keepAr]
+
+def hasDerived(chimpAr,alleleMat):
+    """True at sites where some allele differs from chimp."""
+    alleleAr,countAr=alleleMat
+    presentAr=numpy.arange(alleleAr.shape[1])<countAr[:,None]
+    return ((alleleAr!=chimpAr[:,None])&presentAr).any(axis=1)
+
+def abbaBabaMasks(chimpAr,neandAr,h1Ar,h2Ar):
+    """Boolean masks (h1 derived, h2 derived) for sites where exactly
+    two allele types are present among chimp, Neanderthal and the two
+    humans, the humans differ, and the Neanderthal carries the derived
+    (non-chimp) allele. Arguments broadcast against each other."""
+    usableAr=(neandAr!=chimpAr)&(h1Ar!=h2Ar)
+    usableAr&=(h1Ar==chimpAr)|(h1Ar==neandAr)
+    usableAr&=(h2Ar==chimpAr)|(h2Ar==neandAr)
+    return usableAr&(h1Ar==neandAr),usableAr&(h2Ar==neandAr)
+
+def derAlleleCountReps(chimpAr,neandMat,h1Mat,h2Mat,numReps,rng=None,repBlock=None):
+    """Replicated version of fourPopTest.derAlleleCount: for each of
+    numReps replicates pick one random allele per site from each of the
+    Neanderthal, h1 and h2 matrices and count the sites where h1 (and
+    h2) carries the derived allele shared with the Neanderthal. Return
+    two int arrays of length numReps. Replicates are drawn repBlock at
+    a time (by default sized to about 10^7 picks) to bound memory.
+    Sites that cannot contribute are dropped before drawing, so random
+    numbers differ from a run over all sites."""
+    if rng is None:
+        rng=numpy.random.default_rng()
+    # only sites where the Neanderthal and one of the humans can carry a
+    # derived allele can ever be counted
+    keepAr=hasDerived(chimpAr,neandMat)&(hasDerived(chimpAr,h1Mat)|hasDerived(chimpAr,h2Mat))
+    chimpAr=chimpAr[keepAr]
+    neandMat=subsetMatrix(neandMat,keepAr)
+    h1Mat=subsetMatrix(h1Mat,keepAr)
+    h2Mat=subsetMatrix(h2Mat,keepAr)
+    numSites=len(chimpAr)
+    if repBlock is None:
+        repBlock=max(1,10**7//max(numSites,1))
+    h1CountAr=numpy.zeros(numReps,dtype=numpy.int64)
+    h2CountAr=numpy.zeros(numReps,dtype=numpy.int64)
+    for start in range(0,numReps,repBlock):
+        num=min(repBlock,numReps-start)
+        h1DerAr,h2DerAr=abbaBabaMasks(chimpAr,pickAlleles(neandMat,num,rng),pickAlleles(h1Mat,num,rng),pickAlleles(h2Mat,num,rng))
+        h1CountAr[start:start+num]=h1DerAr.sum(axis=1)
+        h2CountAr[start:start+num]=h2DerAr.sum(axis=1)
+    return h1CountAr,h2CountAr
+
+## exact expectations
+
+def alleleCodes(chimpAr,*alleleMats):
+    """Sorted uint8 codes of every allele present in chimpAr or the
+    matrices."""
+    codeL=[numpy.unique(chimpAr)]
+    for alleleAr,countAr in alleleMats:
+        presentAr=numpy.arange(alleleAr.shape[1])<countAr[:,None]
+        codeL.append(numpy.unique(alleleAr[presentAr]))
+    return numpy.unique(numpy.concatenate(codeL))
+
+def alleleFreqs(alleleMat,codesAr):
+    """Sites x len(codesAr) matrix with the frequency of each allele
+    code at each site."""
+    alleleAr,countAr=alleleMat
+    presentAr=numpy.arange(alleleAr.shape[1])<countAr[:,None]
+    freqAr=numpy.empty((len(countAr),len(codesAr)))
+    for j,code in enumerate(codesAr):
+        freqAr[:,j]=((alleleAr==code)&presentAr).sum(axis=1)
+    return freqAr/countAr[:,None]
+
+def derivedProbs(chimpAr,codesAr,neandFreqAr,h1FreqAr,h2FreqAr):
+    """Per site probabilities that a random pick from each population
+    is counted for h1 (p1Ar) and for h2 (p2Ar) by abbaBabaMasks. h1 is
+    counted when the Neanderthal and h1 share a derived allele a and h2
+    has the chimp allele c, so p1 = f2(c) * sum over a != c of
+    q(a) f1(a), with q the Neanderthal read frequencies."""
+    chimpColAr=numpy.searchsorted(codesAr,chimpAr)
+    rowAr=numpy.arange(len(chimpAr))
+    derNeandAr=neandFreqAr.copy()
+    derNeandAr[rowAr,chimpColAr]=0
+    p1Ar=h2FreqAr[rowAr,chimpColAr]*(derNeandAr*h1FreqAr).sum(axis=1)
+    p2Ar=h1FreqAr[rowAr,chimpColAr]*(derNeandAr*h2FreqAr).sum(axis=1)
+    return p1Ar,p2Ar
+
+def expectedDerCounts(chimpAr,neandMat,h1Mat,h2Mat):
+    """Exact counterpart of derAlleleCountReps: per site probabilities
+    (p1Ar,p2Ar) that h1 and h2 are counted, from allele frequencies. The
+    expected counts are their sums, and since each site adds 1, -1 or 0
+    to the h1 - h2 difference independently, its variance is the sum of
+    p1+p2-(p1-p2)**2."""
+    codesAr=alleleCodes(chimpAr,neandMat,h1Mat,h2Mat)
+    return derivedProbs(chimpAr,codesAr,alleleFreqs(neandMat,codesAr),alleleFreqs(h1Mat,codesAr),alleleFreqs(h2Mat,codesAr))
+
+def expectedDifference(p1Ar,p2Ar):
+    """Mean and standard deviation of the h1 - h2 count difference
+    given the per site probabilities from expectedDerCounts."""
+    difAr=p1Ar-p2Ar
+    return float(difAr.sum()),float(numpy.sqrt((p1Ar+p2Ar-difAr*difAr).sum()))
@@ -1,4 +1,8 @@
 import numpy, random
+from abbaBaba import *
+from jackknife import *
+from siteJoin import *
+from panel import *
 
 def loadNeandReadD(neandFileName):
     """Loads the Neanderthal data file and then returns a dictionary of
@@ -50,6 +54,12 @@ def loadModernHumanData(filename, neandReadD):
 def derAlleleCount(neandReadD,h1SiteDataL,h2SiteDataL):
     """Loads the neanderthal dictionary and the list of tuples for two human populations. 
     This function compares two modern human populations"""
+    # the lists must describe the same sites in the same order
+    if len(h1SiteDataL) != len(h2SiteDataL):
+        raise ValueError("h1SiteDataL and h2SiteDataL should be the same length.")
+    for human1, human2 in zip(h1SiteDataL, h2SiteDataL):
+        if human1[:3] != human2[:3]:
+            raise ValueError("Sites do not line up at "+human1[0]+" "+str(human1[1])+".")
     human1count = 0
     human2count = 0
     #Iterates through each element in the list
@@ -79,40 +89,52 @@ def derAlleleCount(neandReadD,h1SiteDataL,h2SiteDataL):
                         human2count += 1
     return human1count, human2count
 
-def wrapper(finnishFilename, yorubaFilename, chineseFilename, neandFilename):
-    # Wrapper function runs all 3 comparisons
-    neandReadD = loadNeandReadD(neandFilename)
-    finnish = loadModernHumanData(finnishFilename,neandReadD)
-    yoruba = loadModernHumanData(yorubaFilename,neandReadD)
-    chinese = loadModernHumanData(chineseFilename,neandReadD)
-    # Finnish - Yoruba comparison
-    difList = []
-    for _ in range(100):
-        finCount,yorCount=derAlleleCount(neandReadD,finnish,yoruba)
-        difList.append(finCount - yorCount)
-    mean = numpy.mean(difList)
-    stddev = numpy.std(difList)
-    FinYorComp = (mean, stddev)
+def compareReps(chimpAr, neandMat, h1Mat, h2Mat, numReps, rng):
+    """Mean and standard deviation of the h1 - h2 derived allele count
+    difference over numReps replicates, all drawn at once"""
+    h1CountAr, h2CountAr = derAlleleCountReps(chimpAr, neandMat, h1Mat, h2Mat, numReps, rng)
+    difAr = h1CountAr - h2CountAr
+    return (numpy.mean(difAr), numpy.std(difAr))
 
-    # Finnish - Chinese comparison
-    difList = []
-    for _ in range(100):
-        finCount,chiCount=derAlleleCount(neandReadD,finnish,chinese)
-        difList.append(finCount - chiCount)
-    mean = numpy.mean(difList)
-    stddev = numpy.std(difList)
-    FinChiComp = (mean, stddev)
-    
-    # Chinese - Yoruba comparison
-    difList = []
-    for _ in range(100):
-        chiCount,yorCount=derAlleleCount(neandReadD,chinese,yoruba)
-        difList.append(chiCount - yorCount)
-    mean = numpy.mean(difList)
-    stddev = numpy.std(difList)
-    ChiYorComp = (mean, stddev)
+def compareExact(chimpAr, neandMat, h1Mat, h2Mat, numReps=None, rng=None):
+    """Exact mean and standard deviation of the h1 - h2 difference that
+    compareReps estimates, with no sampling"""
+    return expectedDifference(*expectedDerCounts(chimpAr, neandMat, h1Mat, h2Mat))
+
+def wrapper(finnishFilename, yorubaFilename, chineseFilename, neandFilename, numReps=100, seed=None, mode="sample", blockSize=5000000, blockUnit="bp", numWorkers=None):
+    # Wrapper function runs all 3 comparisons. mode "sample" draws
+    # numReps random replicates, "exact" computes the expectation, and
+    # "jackknife" reports the D statistic with a block jackknife standard
+    # error over blocks of blockSize bp or sites (blockUnit)
+    if mode not in ("sample", "exact", "jackknife"):
+        raise ValueError("mode should be 'sample', 'exact' or 'jackknife'.")
+    compare = compareExact if mode == "exact" else compareReps
+    # Join the files once; site matrices are shared by the comparisons
+    siteL, chimpAr, neandMat, (finMat, yorMat, chiMat) = loadJoinedData(neandFilename, [finnishFilename, yorubaFilename, chineseFilename])
+    rng = numpy.random.default_rng(seed)
+
+    if mode == "jackknife":
+        for name, h1Mat, h2Mat in (("Finnish - Yoruba", finMat, yorMat), ("Finnish - Chinese", finMat, chiMat), ("Chinese - Yoruba", chiMat, yorMat)):
+            print("The D statistic and block jackknife standard error for the", name, "comparison are",
+                  jackknifeD(siteL, chimpAr, neandMat, h1Mat, h2Mat, blockSize, blockUnit, numWorkers))
+        return
+
+    FinYorComp = compare(chimpAr, neandMat, finMat, yorMat, numReps, rng)
+    FinChiComp = compare(chimpAr, neandMat, finMat, chiMat, numReps, rng)
+    ChiYorComp = compare(chimpAr, neandMat, chiMat, yorMat, numReps, rng)
 
     print("The mean and standard deviations for the Finnish - Yoruba comparison are", FinYorComp)
     print("The mean and standard deviations for the Finnish - Chinese comparison are", FinChiComp)
     print("The mean and standard deviations for the Chinese - Yoruba comparison are", ChiYorComp)
-    
\ No newline at end of file
+
+def panelWrapper(neandFilename, popFilenameL, mode="exact", quartets=False, blockSize=5000000, blockUnit="bp"):
+    # Runs every pair of populations (or every quartet) in a panel, with
+    # the files joined and the frequencies computed once
+    popPanel = PopulationPanel(neandFilename, popFilenameL)
+    if quartets:
+        resultD = popPanel.allQuartets(mode, blockSize, blockUnit)
+    else:
+        resultD = popPanel.allPairs(mode, blockSize, blockUnit)
+    for key, result in resultD.items():
+        print(" - ".join(key), result)
+    return resultD
@@ -0,0 +1,122 @@
+import multiprocessing
+import numpy
+from abbaBaba import *
+
+# Weighted block jackknife for the D statistic D=(S1-S2)/(S1+S2), with
+# S1 and S2 the expected h1 and h2 derived allele counts (ABBA and BABA)
+# from abbaBaba.expectedDerCounts. Sites are grouped into contiguous
+# genomic blocks, per block totals are computed once (on a process pool
+# for large inputs), and every leave one block out estimate comes from
+# the block totals.
+
+def blockIds(chrL,posAr,blockSize,unit="bp"):
+    """Block number of each site, for sites in file order. With unit
+    'bp' a block is a run of sites on one chromosome in the same
+    blockSize bp window, with unit 'sites' it is a run of blockSize
+    consecutive sites on one chromosome."""
+    if unit not in ("bp","sites"):
+        raise ValueError("unit should be 'bp' or 'sites'.")
+    numSites=len(chrL)
+    if numSites==0:
+        return numpy.zeros(0,dtype=numpy.int64)
+    chrAr=numpy.array(chrL)
+    newChrAr=numpy.ones(numSites,dtype=bool)
+    newChrAr[1:]=chrAr[1:]!=chrAr[:-1]
+    if unit=="bp":
+        binAr=numpy.asarray(posAr)//blockSize
+    else:
+        chrStartAr=numpy.maximum.accumulate(numpy.where(newChrAr,numpy.arange(numSites),0))
+        binAr=(numpy.arange(numSites)-chrStartAr)//blockSize
+    newBlockAr=newChrAr.copy()
+    newBlockAr[1:]|=binAr[1:]!=binAr[:-1]
+    return numpy.cumsum(newBlockAr)-1
+
+def blockTotals(task):
+    """S1, S2 and number of sites for each block of one range of sites.
+    task is (firstBlock,numBlocks,blockIdAr,chimpAr,neandMat,h1Mat,h2Mat)
+    for the sites in the range."""
+    firstBlock,numBlocks,blockIdAr,chimpAr,neandMat,h1Mat,h2Mat=task
+    p1Ar,p2Ar=expectedDerCounts(chimpAr,neandMat,h1Mat,h2Mat)
+    localAr=blockIdAr-firstBlock
+    return (firstBlock,numpy.bincount(localAr,weights=p1Ar,minlength=numBlocks),
+            numpy.bincount(localAr,weights=p2Ar,minlength=numBlocks),
+            numpy.bincount(localAr,minlength=numBlocks))
+
+def sliceMatrix(alleleMat,start,end):
+    alleleAr,countAr=alleleMat
+    return alleleAr[start:end],countAr[start:end]
+
+def blockCounts(blockIdAr,chimpAr,neandMat,h1Mat,h2Mat,numWorkers=None,sitesPerTask=200000):
+    """Per block totals (s1Ar,s2Ar,numSitesAr) for blocks numbered as by
+    blockIds. Inputs of more than sitesPerTask sites are cut at block
+    boundaries into tasks of about that size and run on a pool of
+    numWorkers processes (default one per core)."""
+    numBlocks=int(blockIdAr[-1])+1 if len(blockIdAr) else 0
+    s1Ar=numpy.zeros(numBlocks)
+    s2Ar=numpy.zeros(numBlocks)
+    numSitesAr=numpy.zeros(numBlocks,dtype=numpy.int64)
+    blockStartAr=numpy.searchsorted(blockIdAr,numpy.arange(numBlocks+1))
+    cutL=[0]
+    for start in blockStartAr[1:-1].tolist():
+        if start-cutL[-1]>=sitesPerTask:
+            cutL.append(start)
+    cutL.append(len(blockIdAr))
+    taskL=[]
+    for start,end in zip(cutL[:-1],cutL[1:]):
+        firstBlock=int(blockIdAr[start])
+        taskL.append((firstBlock,int(blockIdAr[end-1])-firstBlock+1,blockIdAr[start:end],chimpAr[start:end],
+                      sliceMatrix(neandMat,start,end),sliceMatrix(h1Mat,start,end),sliceMatrix(h2Mat,start,end)))
+    if len(taskL)<2 or numWorkers==1:
+        resultIter=map(blockTotals,taskL)
+        pool=None
+    else:
+        pool=multiprocessing.Pool(numWorkers)
+        resultIter=pool.imap_unordered(blockTotals,taskL)
+    try:
+        for firstBlock,taskS1Ar,taskS2Ar,taskSitesAr in resultIter:
+            s1Ar[firstBlock:firstBlock+len(taskS1Ar)]=taskS1Ar
+            s2Ar[firstBlock:firstBlock+len(taskS2Ar)]=taskS2Ar
+            numSitesAr[firstBlock:firstBlock+len(taskSitesAr)]=taskSitesAr
+    except BaseException:
+        # stop the workers rather than wait for the queued tasks
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return s1Ar,s2Ar,numSitesAr
+
+def dStat(s1,s2):
+    return (s1-s2)/(s1+s2)
+
+def weightedJackknife(s1Ar,s2Ar,weightAr):
+    """Weighted delete one block jackknife (Busing et al. 1999) of D
+    from per block totals. weightAr gives each block's weight (its
+    number of sites). Return D from all blocks and its standard error.
+    Blocks with no ABBA or BABA counts are left out."""
+    keepAr=(s1Ar+s2Ar)>0
+    s1Ar=s1Ar[keepAr]
+    s2Ar=s2Ar[keepAr]
+    weightAr=numpy.asarray(weightAr,dtype=float)[keepAr]
+    numBlocks=len(s1Ar)
+    if numBlocks<2:
+        raise ValueError("Need at least two informative blocks for a jackknife.")
+    theta=dStat(s1Ar.sum(),s2Ar.sum())
+    leaveOutAr=dStat(s1Ar.sum()-s1Ar,s2Ar.sum()-s2Ar)
+    total=weightAr.sum()
+    thetaJ=numBlocks*theta-((1-weightAr/total)*leaveOutAr).sum()
+    hAr=total/weightAr
+    pseudoAr=hAr*theta-(hAr-1)*leaveOutAr
+    var=(((pseudoAr-thetaJ)**2)/(hAr-1)).sum()/numBlocks
+    return float(theta),float(numpy.sqrt(var))
+
+def jackknifeD(siteDataL,chimpAr,neandMat,h1Mat,h2Mat,blockSize=5000000,unit="bp",numWorkers=None):
+    """D statistic and weighted block jackknife standard error for h1
+    and h2, with blocks of blockSize bp or sites (see blockIds) over the
+    sites of siteDataL, (chrom,pos,...) records such as the siteL of
+    siteJoin.loadJoinedData or the output of loadModernHumanData."""
+    blockIdAr=blockIds([site[0] for site in siteDataL],[site[1] for site in siteDataL],blockSize,unit)
+    s1Ar,s2Ar,numSitesAr=blockCounts(blockIdAr,chimpAr,neandMat,h1Mat,h2Mat,numWorkers)
+    return weightedJackknife(s1Ar,s2Ar,numSitesAr)
@@ -0,0 +1,133 @@
+import os
+import numpy
+from abbaBaba import *
+from jackknife import *
+from siteJoin import *
+
+# Four population tests over a whole panel of populations. The files are
+# joined once, each population's per site allele frequencies are
+# computed once, and the per population vectors the tests combine are
+# cached, so each pair or quartet costs a few vector operations.
+
+NEAND="Neanderthal"
+CHIMP="Chimp"
+
+class PopulationPanel:
+    """Aligned allele frequencies for the Neanderthal, the chimp and a
+    list of modern human populations (named by popNameL, default the
+    file names without extension). chromOrderL is passed to
+    siteJoin.joinSites."""
+
+    def __init__(self,neandFileName,popFileNameL,popNameL=None,chromOrderL=None):
+        if popNameL is None:
+            popNameL=[os.path.splitext(os.path.basename(fileName))[0] for fileName in popFileNameL]
+        if len(set(popNameL)|{NEAND,CHIMP})!=len(popNameL)+2:
+            raise ValueError("Population names should be unique and not "+NEAND+" or "+CHIMP+".")
+        self.popNameL=list(popNameL)
+        self.siteL,self.chimpAr,neandMat,popMatL=loadJoinedData(neandFileName,popFileNameL,chromOrderL)
+        self.codesAr=alleleCodes(self.chimpAr,neandMat,*popMatL)
+        self.chimpColAr=numpy.searchsorted(self.codesAr,self.chimpAr)
+        chimpFreqAr=numpy.zeros((len(self.chimpAr),len(self.codesAr)))
+        chimpFreqAr[numpy.arange(len(self.chimpAr)),self.chimpColAr]=1
+        self.freqD={NEAND:alleleFreqs(neandMat,self.codesAr),CHIMP:chimpFreqAr}
+        for name,popMat in zip(self.popNameL,popMatL):
+            self.freqD[name]=alleleFreqs(popMat,self.codesAr)
+        self.dotD={}
+        self.derivedD={}
+        self.blockIdD={}
+
+    def names(self):
+        return [NEAND,CHIMP]+self.popNameL
+
+    def dot(self,name1,name2):
+        """Per site probability that random alleles from the two
+        populations match, cached by unordered pair."""
+        key=tuple(sorted((name1,name2)))
+        if key not in self.dotD:
+            self.dotD[key]=(self.freqD[name1]*self.freqD[name2]).sum(axis=1)
+        return self.dotD[key]
+
+    def quartetProbs(self,h1,h2,p3,out):
+        """Per site probabilities (p1Ar,p2Ar) that random picks from
+        h1, h2, p3 and out form a counted pattern (see
+        abbaBaba.abbaBabaMasks with out in place of the chimp and p3 in
+        place of the Neanderthal). p1 = sum over b and a != b of
+        fout(b) f3(a) f1(a) f2(b), from the cached pairwise matches
+        less the four way match."""
+        quadAr=(self.freqD[h1]*self.freqD[h2]*self.freqD[p3]*self.freqD[out]).sum(axis=1)
+        p1Ar=self.dot(out,h2)*self.dot(p3,h1)-quadAr
+        p2Ar=self.dot(out,h1)*self.dot(p3,h2)-quadAr
+        return p1Ar,p2Ar
+
+    def pairProbs(self,h1,h2):
+        """quartetProbs with the Neanderthal as p3 and the chimp as the
+        outgroup, as in fourPopTest. Then p1 = f2(chimp) times the
+        cached match of h1 with the Neanderthal's derived reads."""
+        chimp1Ar,derived1Ar=self.derivedVectors(h1)
+        chimp2Ar,derived2Ar=self.derivedVectors(h2)
+        return chimp2Ar*derived1Ar,chimp1Ar*derived2Ar
+
+    def derivedVectors(self,name):
+        """Cached per site vectors for name: the frequency of the chimp
+        allele, and the probability that a random allele matches a
+        random derived (non-chimp) Neanderthal read."""
+        if name not in self.derivedD:
+            rowAr=numpy.arange(len(self.chimpAr))
+            chimpFreqAr=self.freqD[name][rowAr,self.chimpColAr]
+            neandChimpAr=self.freqD[NEAND][rowAr,self.chimpColAr]
+            self.derivedD[name]=(chimpFreqAr,self.dot(NEAND,name)-neandChimpAr*chimpFreqAr)
+        return self.derivedD[name]
+
+    def blockIds(self,blockSize,unit):
+        key=(blockSize,unit)
+        if key not in self.blockIdD:
+            self.blockIdD[key]=blockIds([site[0] for site in self.siteL],[site[1] for site in self.siteL],blockSize,unit)
+        return self.blockIdD[key]
+
+    def summarize(self,p1Ar,p2Ar,mode,blockSize,unit):
+        """(mean,std) of the h1 - h2 count difference for mode 'exact',
+        (D,standard error) for mode 'jackknife'."""
+        if mode=="exact":
+            return expectedDifference(p1Ar,p2Ar)
+        blockIdAr=self.blockIds(blockSize,unit)
+        return weightedJackknife(numpy.bincount(blockIdAr,weights=p1Ar),numpy.bincount(blockIdAr,weights=p2Ar),numpy.bincount(blockIdAr))
+
+    def allPairs(self,mode="exact",blockSize=5000000,unit="bp"):
+        """Compare every pair of modern human populations against the
+        Neanderthal and chimp. Return a dictionary keyed by (h1,h2), in
+        panel order, of the result of summarize."""
+        checkMode(mode)
+        resultD={}
+        for i,h1 in enumerate(self.popNameL):
+            for h2 in self.popNameL[i+1:]:
+                resultD[h1,h2]=self.summarize(*self.pairProbs(h1,h2),mode,blockSize,unit)
+        return resultD
+
+    def allQuartets(self,mode="exact",blockSize=5000000,unit="bp",outgroupL=None):
+        """Every (h1,h2,p3,out) quartet of distinct panel members (the
+        Neanderthal and chimp included) with h1 before h2 in panel
+        order, since swapping them only flips the sign. outgroupL limits
+        the outgroups (default [CHIMP]). Return a dictionary keyed by
+        the quartet of the result of summarize. Quartets with no
+        counted sites are left out of jackknife results."""
+        checkMode(mode)
+        if outgroupL is None:
+            outgroupL=[CHIMP]
+        nameL=self.names()
+        resultD={}
+        for out in outgroupL:
+            for p3 in nameL:
+                if p3==out:
+                    continue
+                otherL=[name for name in nameL if name not in (p3,out)]
+                for i,h1 in enumerate(otherL):
+                    for h2 in otherL[i+1:]:
+                        p1Ar,p2Ar=self.quartetProbs(h1,h2,p3,out)
+                        if mode=="jackknife" and not (p1Ar.sum()+p2Ar.sum())>0:
+                            continue
+                        resultD[h1,h2,p3,out]=self.summarize(p1Ar,p2Ar,mode,blockSize,unit)
+        return resultD
+
+def checkMode(mode):
+    if mode not in ("exact","jackknife"):
+        raise ValueError("mode should be 'exact' or 'jackknife'.")
@@ -0,0 +1,106 @@
+import numpy
+from abbaBaba import *
+
+# Streaming join of the Neanderthal read file and modern human
+# population files. All files must be sorted by chromosome and then
+# position, with the chromosomes in one shared order: by default the
+# order in which they first appear in the Neanderthal file, so natural
+# (1, 2, 10) and lexicographic (1, 10, 2) sorted files both work. The
+# join walks every file in lockstep and keeps only one line of each in
+# memory, emitting the sites present in all of them.
+
+def chromOrder(neandFileName):
+    """Chromosomes of the Neanderthal file in order of first appearance,
+    from one pass over its first column."""
+    orderL=[]
+    seenS=set()
+    with open(neandFileName) as f:
+        for s in f:
+            L=s.split(None,1)
+            if L and L[0] not in seenS:
+                seenS.add(L[0])
+                orderL.append(L[0])
+    return orderL
+
+def checkedSites(siteIter,fileName,rankD):
+    """Generator over (key,site) for (chrom,pos,...) records, with key
+    (rankD[chrom],pos). Records on chromosomes not in rankD are skipped,
+    as they cannot join. Raises ValueError if keys are not strictly
+    increasing."""
+    lastKey=None
+    for site in siteIter:
+        if site[0] not in rankD:
+            continue
+        key=(rankD[site[0]],site[1])
+        if lastKey is not None and key<=lastKey:
+            raise ValueError(fileName+" is not sorted by chromosome and position at "+site[0]+" "+str(site[1])+".")
+        lastKey=key
+        yield key,site
+
+def readNeandSites(neandFileName):
+    """Generator over (chrom,pos,reads) in the Neanderthal file, with
+    reads a string of the read alleles."""
+    with open(neandFileName) as f:
+        for s in f:
+            L=s.split()
+            if L:
+                yield L[0],int(L[1]),L[2].replace(",","")
+
+def readPopSites(fileName):
+    """Generator over (chrom,pos,chimp,alleles) in a population file
+    (header line first), with alleles a string of all the haplotypes'
+    alleles at the site."""
+    with open(fileName) as f:
+        f.readline()
+        for s in f:
+            L=s.split()
+            if L:
+                yield L[0],int(L[1]),L[4],"".join(L[5:]).replace(",","")
+
+def joinSites(neandFileName,popFileNameL,chromOrderL=None):
+    """Generator over sites present in the Neanderthal file and every
+    population file, yielding (chrom,pos,chimp,neandReads,allelesL) with
+    allelesL holding each population's allele string in the order of
+    popFileNameL. chromOrderL is the chromosome order the files are
+    sorted in (default chromOrder(neandFileName)); chromosomes not in it
+    are skipped. Raises ValueError if a file is out of order or the
+    populations disagree on the chimp allele."""
+    if chromOrderL is None:
+        chromOrderL=chromOrder(neandFileName)
+    rankD={chrom:rank for rank,chrom in enumerate(chromOrderL)}
+    iterL=[checkedSites(readNeandSites(neandFileName),neandFileName,rankD)]
+    iterL+=[checkedSites(readPopSites(fileName),fileName,rankD) for fileName in popFileNameL]
+    currentL=[next(siteIter,None) for siteIter in iterL]
+    while None not in currentL:
+        keyL=[key for key,site in currentL]
+        target=max(keyL)
+        if min(keyL)==target:
+            chrom,pos,neandReads=currentL[0][1]
+            chimp=currentL[1][1][2]
+            for fileName,(key,site) in zip(popFileNameL,currentL[1:]):
+                if site[2]!=chimp:
+                    raise ValueError("Chimp allele in "+fileName+" differs from "+popFileNameL[0]+" at "+chrom+" "+str(pos)+".")
+            yield chrom,pos,chimp,neandReads,[site[3] for key,site in currentL[1:]]
+            currentL=[next(siteIter,None) for siteIter in iterL]
+        else:
+            for i in range(len(iterL)):
+                while currentL[i] is not None and currentL[i][0]<target:
+                    currentL[i]=next(iterL[i],None)
+
+def loadJoinedData(neandFileName,popFileNameL,chromOrderL=None):
+    """Join the files (see joinSites) and return siteL, a list of
+    (chrom,pos) for the shared sites, chimpAr, the Neanderthal
+    (alleleAr,countAr) matrix and a list of population matrices, all
+    aligned site by site."""
+    siteL=[]
+    chimpL=[]
+    neandL=[]
+    popAllelesLL=[[] for fileName in popFileNameL]
+    for chrom,pos,chimp,neandReads,allelesL in joinSites(neandFileName,popFileNameL,chromOrderL):
+        siteL.append((chrom,pos))
+        chimpL.append(chimp)
+        neandL.append(neandReads)
+        for popAllelesL,alleles in zip(popAllelesLL,allelesL):
+            popAllelesL.append(alleles)
+    chimpAr=numpy.frombuffer("".join(chimpL).encode(),dtype=numpy.uint8)
+    return siteL,chimpAr,alleleMatrix(neandL),[alleleMatrix(popAllelesL) for popAllelesL in popAllelesLL]